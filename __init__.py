@@ -7,99 +7,189 @@ import subprocess
 import threading
 import glob
 import re
+import sqlite3
 from pathlib import Path
 from concurrent.futures import Future
 from dataclasses import dataclass
-from typing import List, cast, Optional, Dict, Any
+from typing import List, cast, Optional, Dict, Any, Tuple, Callable
 
 from anki.lang import compatMap
-from anki.sound import AVTag, TTSTag
-from aqt import mw
-from aqt.utils import showInfo, qconnect
-from aqt.qt import QAction
+from anki.sound import AVTag, SoundOrVideoTag, TTSTag
+from aqt import mw, gui_hooks
+from aqt.utils import showInfo, qconnect, getText
+from aqt.qt import QAction, QDialog, QFileDialog, QFontDatabase, QHBoxLayout, QPlainTextEdit, QPushButton, QVBoxLayout
 from aqt.sound import OnDoneCallback, av_player
 from aqt.tts import TTSProcessPlayer, TTSVoice
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "vendor"))
 
-from gtts import gTTS, gTTSError
+# gTTS itself (and requests) is imported on first synthesis, not at startup.
 from gtts.lang import tts_langs
 
+from .audio_index import AudioDictionaryIndex
+from .config_snapshot import ConfigSnapshot, VoiceSettings
+from .memory_cache import BoundedCache
+from .piper_worker import PiperBatchRunner, PiperWorkerPool
+from .prefetch import Prefetcher
+from .prerender import RenderJob, RenderReport, render_jobs
+from .single_flight import SingleFlight
+from .packed_cache import PackedCache
+from .persistent_cache import PersistentCache, content_key, make_temp_path, normalize_text, remove_quietly
+from .gtts_fetch import GTTSFetcher
+from .stats import STATS, outside_playback, timed
+from .streaming import SegmentPlayback
+
 # --- Global In-Memory Caches ---
 
 # For Audio Dictionary: { ("Text", "lang"): { "files": [...], "next_idx": 0 } }
-AUDIO_LOOKUP_CACHE: Dict[tuple, Dict[str, Any]] = {}
+AUDIO_LOOKUP_CACHE = BoundedCache()
 
 # For TTS Cycling: { ("Text", "lang"): "NextEngineString" }
-TTS_CYCLE_STATE: Dict[tuple, str] = {}
+TTS_CYCLE_STATE = BoundedCache()
+
+def configure_memory_caches(conf) -> None:
+    max_entries = conf.get("memory_cache_max_entries", 10000)
+    negative_ttl = conf.get("audio_dictionary_negative_ttl_sec", 600)
+    AUDIO_LOOKUP_CACHE.configure(max_entries, negative_ttl)
+    TTS_CYCLE_STATE.configure(max_entries, 0)
 
-CONFIG = mw.addonManager.getConfig(__name__)
+def memory_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {
+        "audio_lookup": AUDIO_LOOKUP_CACHE.stats(),
+        "tts_cycle": TTS_CYCLE_STATE.stats(),
+    }
+
+# Rebuilt whenever the config changes, so playback never re-reads it.
+CONFIG_SNAPSHOT: Optional[ConfigSnapshot] = None
 
 def get_config():
+    """A fresh, editable copy of the config; save changes with write_config()."""
     return mw.addonManager.getConfig(__name__)
 
+def current_config() -> ConfigSnapshot:
+    """The config as of its last change. Cheap; use this on the playback path."""
+    snapshot = CONFIG_SNAPSHOT
+    if snapshot is None:
+        snapshot = refresh_config(get_config())
+    return snapshot
+
+def refresh_config(new_config) -> ConfigSnapshot:
+    """Replaces the snapshot and applies settings that live outside it."""
+    global CONFIG_SNAPSHOT
+    snapshot = ConfigSnapshot(
+        new_config,
+        voices=gtts_voices(),
+        default_cache_dir=os.path.join(os.path.dirname(__file__), "user_cache")
+    )
+    CONFIG_SNAPSHOT = snapshot
+    configure_memory_caches(snapshot)
+    configure_persistent_cache(snapshot)
+    STATS.enabled = snapshot.get("stats_enabled", False)
+    return snapshot
+
 def write_config(new_config):
     mw.addonManager.writeConfig(__name__, new_config)
+    refresh_config(new_config)
 
 def sanitize_filename(text: str) -> str:
     text = re.sub(r'[<>:"/\\|?*]', '', text)
     return text.strip().lower()
 
-def find_in_audio_dictionary(text: str, lang: str) -> Optional[str]:
+# --- Audio Dictionary Index ---
+
+AUDIO_INDEX = AudioDictionaryIndex(
+    os.path.join(os.path.dirname(__file__), "user_files", "audio_dictionary_index.sqlite3")
+)
+
+def get_audio_index(conf) -> Optional[AudioDictionaryIndex]:
     """
-    Searches for audio files locally.
-    Implements in-memory caching and cycling logic.
+    Returns the on-disk dictionary index for the configured root and
+    schedules an incremental background refresh when it is due.
+    """
+    if not conf.get("audio_dictionary_index_enabled", True):
+        return None
+    root_path = conf.dictionary_root
+    if not root_path:
+        return None
+    AUDIO_INDEX.configure(root_path, conf.dictionary_exclusions)
+    refresh_min = conf.get("audio_dictionary_index_refresh_min", 30)
+    AUDIO_INDEX.refresh_async(min_interval=refresh_min * 60)
+    return AUDIO_INDEX
+
+def lookup_audio_dictionary(text: str, lang: str, conf) -> Optional[Dict[str, Any]]:
+    """
+    Returns the cached lookup entry { "files": [...], "next_idx": 0 } for a
+    text, populating it from the index or the file system if missing.
+    Does not advance the cycle position.
     """
-    conf = get_config()
     if not conf.get("audio_dictionary_enabled", False):
         return None
 
     cache_key = (text, lang)
 
-    # 1. Populate Cache if missing
-    if cache_key not in AUDIO_LOOKUP_CACHE:
-        root_path = conf.get("audio_dictionary_path", "").strip()
-        if not root_path or not os.path.exists(root_path):
+    cache_data = AUDIO_LOOKUP_CACHE.get(cache_key)
+    if cache_data is None:
+        root_path = conf.dictionary_root
+        if not root_path:
             return None
 
-        exclusions = conf.get("audio_dictionary_exclusions", [])
-        lang_map = conf.get("audio_dictionary_lang_map", {})
-
-        default_short = lang.split('_')[0] if '_' in lang else lang
-        target_folder = default_short 
-        
-        if lang in lang_map:
-            target_folder = lang_map[lang]
-        elif default_short in lang_map:
-            target_folder = lang_map[default_short]
+        exclusions = conf.dictionary_exclusions
+        target_folder = conf.voice(lang).dictionary_folder
 
         clean_name = sanitize_filename(text)
-        filename = f"{clean_name}.mp3"
-        search_pattern = os.path.join(root_path, target_folder, "*", filename)
-        
-        candidates = glob.glob(search_pattern)
-        
-        valid_candidates = []
-        if candidates:
-            candidates.sort()
-            for path in candidates:
-                if exclusions and any(ex in path for ex in exclusions):
-                    continue
-                if os.path.exists(path) and os.path.getsize(path) > 0:
-                    valid_candidates.append(path)
-
-        AUDIO_LOOKUP_CACHE[cache_key] = {
+
+        # Index lookup; None means the first index build is still running.
+        valid_candidates = None
+        index = get_audio_index(conf)
+        if index:
+            valid_candidates = index.lookup(target_folder, clean_name)
+
+        if valid_candidates is None:
+            filename = f"{clean_name}.mp3"
+            search_pattern = os.path.join(root_path, target_folder, "*", filename)
+
+            candidates = glob.glob(search_pattern)
+
+            valid_candidates = []
+            if candidates:
+                candidates.sort()
+                for path in candidates:
+                    if exclusions and any(ex in path for ex in exclusions):
+                        continue
+                    if os.path.exists(path) and os.path.getsize(path) > 0:
+                        valid_candidates.append(path)
+
+        cache_data = {
             "files": valid_candidates,
             "next_idx": 0
         }
+        # Negative results expire so newly added recordings are found.
+        AUDIO_LOOKUP_CACHE.set(cache_key, cache_data, negative=not valid_candidates)
+
+    return cache_data
+
+@timed("find_in_audio_dictionary")
+def find_in_audio_dictionary(text: str, lang: str) -> Optional[str]:
+    """
+    Searches for audio files locally.
+    Implements in-memory caching and cycling logic.
+    """
+    conf = current_config()
+
+    # 1. Populate Cache if missing
+    cache_data = lookup_audio_dictionary(text, lang, conf)
+    if cache_data is None:
+        return None
 
     # 2. Retrieve from Cache
-    cache_data = AUDIO_LOOKUP_CACHE[cache_key]
     files = cache_data["files"]
 
     if not files:
+        STATS.count("Audio Dictionary", "miss")
         return None
 
+    STATS.count("Audio Dictionary", "hit")
+
     # 3. Cycle Logic
     cycle_enabled = conf.get("audio_dictionary_cycle_enabled", False)
     cycle_limit = max(1, conf.get("audio_dictionary_cycle_limit", 2))
@@ -121,25 +211,60 @@ def find_in_audio_dictionary(text: str, lang: str) -> Optional[str]:
 
     return selected_file
 
-def run_piper_tts(text: str, lang: str, output_path: str) -> bool:
-    conf = get_config()
+# --- Resident Piper Workers ---
+
+PIPER_WORKERS = PiperWorkerPool()
+
+def configure_piper_workers(conf) -> bool:
+    """Applies the worker settings; False if worker mode is off."""
+    if not conf.get("piper_worker_enabled", False):
+        return False
+    PIPER_WORKERS.configure(
+        conf.get("piper_worker_pool_size", 1),
+        conf.get("piper_worker_timeout_sec", 30)
+    )
+    return True
+
+def run_piper_worker(python_exe: str, script_path: str, lang_code: str, text: str, output_path: str) -> Optional[bool]:
+    """
+    Synthesizes through a resident worker process if enabled.
+    Returns None when the caller should use the one-shot subprocess instead.
+    """
+    if not configure_piper_workers(current_config()):
+        return None
+    return PIPER_WORKERS.synthesize(python_exe, script_path, lang_code, text, output_path)
+
+def piper_command_paths(conf) -> Optional[Tuple[str, str]]:
+    """The configured (python, script) pair, or None if either is missing."""
     python_exe = conf.get("piper_python_path")
     script_path = conf.get("piper_script_path")
-    
-    temp_output_path = f"{output_path}.temp"
 
     if not all([python_exe, script_path]):
         print("Piper TTS: Python executable or script path not configured.")
-        return False
-        
+        return None
+
     if not Path(python_exe).exists() or not Path(script_path).exists():
         print(f"Piper TTS: Path does not exist. Python: '{python_exe}', Script: '{script_path}'")
+        return None
+    return python_exe, script_path
+
+@timed("run_piper_tts")
+def run_piper_tts(text: str, lang_code: str, output_path: str) -> bool:
+    """Synthesizes text with Piper; lang_code is VoiceSettings.piper_lang."""
+    paths = piper_command_paths(current_config())
+    if paths is None:
         return False
+    python_exe, script_path = paths
 
-    if "_" in lang:
-        lang_code = lang.split("_")[0]
-    else:
-        lang_code = lang
+    temp_output_path = make_temp_path(output_path)
+
+    worker_result = run_piper_worker(python_exe, script_path, lang_code, text, temp_output_path)
+    if worker_result is not None:
+        if worker_result and PERSISTENT_CACHE.commit(temp_output_path, output_path, "Piper"):
+            print(f"Piper TTS (worker) successfully generated: {output_path}")
+            return True
+        remove_quietly(temp_output_path)
+        return False
 
     command = [
         python_exe,
@@ -158,72 +283,141 @@ def run_piper_tts(text: str, lang: str, output_path: str) -> bool:
             encoding='utf-8',
             creationflags=creation_flags
         )
-        if process.returncode == 0 and os.path.exists(temp_output_path) and os.path.getsize(temp_output_path) > 0:
-            if os.path.exists(output_path):
-                try:
-                    os.remove(output_path)
-                except OSError:
-                    pass
-            os.rename(temp_output_path, output_path)
+        if process.returncode == 0 and PERSISTENT_CACHE.commit(temp_output_path, output_path, "Piper"):
             print(f"Piper TTS successfully generated: {output_path}")
             return True
         else:
             print(f"Piper TTS Error: {process.stderr}")
-            if os.path.exists(temp_output_path):
-                os.remove(temp_output_path)
+            remove_quietly(temp_output_path)
             return False
     except Exception as e:
         print(f"Failed to run Piper TTS process: {e}")
-        if os.path.exists(temp_output_path):
-            try:
-                os.remove(temp_output_path)
-            except:
-                pass
+        remove_quietly(temp_output_path)
         return False
 
-def run_gtts_with_timeout(text: str, lang: str, slow: bool, output_path: str) -> bool:
-    conf = get_config()
+# --- Batched Piper Synthesis ---
+
+PIPER_BATCH = PiperBatchRunner()
+
+@timed("run_piper_batch")
+def run_piper_batch(
+    jobs: List[Tuple[str, str, str]],
+    on_result: Optional[Callable[[int, bool], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Optional[bool]]:
+    """
+    Synthesizes (text, lang_code, output_path) jobs with one Piper process
+    per language: a resident worker if enabled, otherwise one --batch-file run.
+    Jobs the batch could not answer are retried one by one. Each job's
+    result is passed to on_result(index, ok) as soon as it is known; jobs
+    skipped because `cancel` was set are None.
+    """
+    results: List[Optional[bool]] = [False] * len(jobs)
+    if not jobs:
+        return results
+    conf = current_config()
+    paths = piper_command_paths(conf)
+    if paths is None:
+        return results
+    python_exe, script_path = paths
+
+    def report(index: int, ok: bool) -> None:
+        results[index] = ok
+        if on_result:
+            on_result(index, ok)
+
+    groups: Dict[str, List[int]] = {}
+    for index, (_, lang_code, _) in enumerate(jobs):
+        groups.setdefault(lang_code, []).append(index)
+
+    for lang_code, indexes in groups.items():
+        if cancel is not None and cancel.is_set():
+            for i in indexes:
+                results[i] = None
+            continue
+        temp_paths = [make_temp_path(jobs[i][2]) for i in indexes]
+        items = [(jobs[i][0], temp_path) for i, temp_path in zip(indexes, temp_paths)]
+        generated = 0
+
+        def on_item(position: int, ok: bool) -> None:
+            nonlocal generated
+            i, temp_path = indexes[position], temp_paths[position]
+            if ok and PERSISTENT_CACHE.commit(temp_path, jobs[i][2], "Piper"):
+                generated += 1
+                report(i, True)
+                return
+            remove_quietly(temp_path)
+            report(i, False)
+
+        outcomes = None
+        if configure_piper_workers(conf):
+            outcomes = PIPER_WORKERS.synthesize_batch(python_exe, script_path, lang_code, items, on_item, cancel)
+        if outcomes is None:
+            outcomes = PIPER_BATCH.synthesize(python_exe, script_path, lang_code, items, on_item, cancel)
+        if outcomes is None:
+            outcomes = [None] * len(items)
+
+        # Answered jobs went through on_item; the rest are retried one by one.
+        for i, temp_path, ok in zip(indexes, temp_paths, outcomes):
+            if ok is not None:
+                continue
+            remove_quietly(temp_path)
+            if cancel is not None and cancel.is_set():
+                results[i] = None
+                continue
+            text, _, output_path = jobs[i]
+            ok = run_piper_tts(text, lang_code, output_path)
+            if ok:
+                generated += 1
+            report(i, ok)
+        print(f"Piper TTS (batch) generated {generated}/{len(indexes)} for '{lang_code}'")
+    return results
+
+GTTS_FETCHER = GTTSFetcher()
+
+def prepare_gtts(conf, text: str, lang: str, slow: bool):
+    """Applies the gTTS fetcher settings and returns a factory for the audio stream."""
+    from gtts import gTTS
+
     timeout = conf.get("gtts_timeout_sec", 5)
-    result_container = {}
-    
-    temp_output_path = f"{output_path}.temp"
+    parallel_requests = conf.get("gtts_parallel_requests", 4)
+    GTTS_FETCHER.configure(
+        conf.get("gtts_max_outstanding", 4),
+        conf.get("gtts_circuit_failures", 3),
+        conf.get("gtts_circuit_cooldown_sec", 60)
+    )
 
-    def gtts_save_job():
-        try:
-            tts = gTTS(text=text, lang=lang, lang_check=False, slow=slow)
-            tts.save(temp_output_path)
-            result_container['success'] = True
-        except Exception as e:
-            result_container['error'] = e
+    def gtts_stream():
+        tts = gTTS(
+            text=text,
+            lang=lang,
+            lang_check=False,
+            slow=slow,
+            pooled_session=True,
+            max_workers=parallel_requests,
+            timeout=(timeout, timeout)
+        )
+        return tts.stream()
 
-    try:
-        thread = threading.Thread(target=gtts_save_job)
-        thread.start()
-        thread.join(timeout=timeout)
+    return gtts_stream
 
-        if thread.is_alive():
-            print(f"gTTS timed out after {timeout} seconds.")
-            return False
-        
-        if 'error' in result_container:
-            if os.path.exists(temp_output_path):
-                try:
-                    os.remove(temp_output_path)
-                except:
-                    pass
-            raise result_container['error']
-        
-        if os.path.exists(temp_output_path) and os.path.getsize(temp_output_path) > 0:
-            if os.path.exists(output_path):
-                try:
-                    os.remove(output_path)
-                except OSError:
-                    pass
-            os.rename(temp_output_path, output_path)
-            return True
-        
-        return False
+@timed("run_gtts_with_timeout")
+def run_gtts_with_timeout(text: str, lang: str, slow: bool, output_path: str, background: bool = False) -> Optional[bool]:
+    """
+    Downloads gTTS audio into the cache at output_path. Returns None if
+    the download was not attempted; `background` downloads wait for a slot.
+    """
+    from gtts import gTTSError
+
+    conf = current_config()
+    timeout = conf.get("gtts_timeout_sec", 5)
+    gtts_stream = prepare_gtts(conf, text, lang, slow)
+    temp_output_path = make_temp_path(output_path)
 
+    try:
+        fetched = GTTS_FETCHER.fetch(gtts_stream, temp_output_path, timeout, background)
+        if not fetched:
+            return fetched
     except gTTSError as e:
         print(f"gTTS API Error: {e}")
         return False
@@ -231,28 +425,362 @@ def run_gtts_with_timeout(text: str, lang: str, slow: bool, output_path: str) ->
         print(f"gTTS general error: {e}")
         return False
 
+    return PERSISTENT_CACHE.commit(temp_output_path, output_path, "gTTS")
+
+# --- Single-Flight Synthesis ---
+
+# Playback, prefetch and pre-render asking for the same audio at the same
+# time share one download or Piper run.
+SYNTHESIS_FLIGHTS = SingleFlight()
+
+def synthesis_key(engine: str, text: str, lang: str, speed: str, output_path: str) -> tuple:
+    # Followers only get True back, so they must be waiting for the same file.
+    return (engine, normalize_text(text), lang, speed, os.path.normcase(os.path.abspath(output_path)))
+
+def generate_gtts(text: str, lang: str, slow: bool, output_path: str, background: bool = False) -> Optional[bool]:
+    if background and not GTTS_FETCHER.wait_for_background_slot():
+        # Waiting inside the flight would hold up playback of the same text.
+        return None
+    key = synthesis_key("gTTS", text, lang, "slow" if slow else "normal", output_path)
+    return SYNTHESIS_FLIGHTS.run(key, lambda: run_gtts_with_timeout(text, lang, slow, output_path, background))
+
+def generate_piper(text: str, lang_code: str, output_path: str) -> bool:
+    key = synthesis_key("Piper", text, lang_code, "", output_path)
+    return SYNTHESIS_FLIGHTS.run(key, lambda: run_piper_tts(text, lang_code, output_path))
+
+def generate_piper_batch(
+    jobs: List[Tuple[str, str, str]],
+    on_result: Optional[Callable[[int, bool], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Optional[bool]]:
+    """
+    generate_piper() for many jobs at once. Texts already being synthesized
+    into the same file elsewhere are waited for instead of being run again.
+    Results are published (and passed to on_result) per job as they come
+    in; jobs skipped because `cancel` was set are None.
+    """
+    results: List[Optional[bool]] = [False] * len(jobs)
+
+    def report(index: int, ok: bool) -> None:
+        results[index] = ok
+        if on_result:
+            on_result(index, ok)
+
+    leading = []
+    following = []
+    for index, (text, lang_code, output_path) in enumerate(jobs):
+        key = synthesis_key("Piper", text, lang_code, "", output_path)
+        future, leader = SYNTHESIS_FLIGHTS.begin(key)
+        (leading if leader else following).append((index, key, future))
+
+    def on_leader_result(position: int, ok: bool) -> None:
+        index, key, future = leading[position]
+        SYNTHESIS_FLIGHTS.finish(key, future, ok)
+        report(index, ok)
+
+    try:
+        outcomes = run_piper_batch([jobs[index] for index, _, _ in leading], on_leader_result, cancel)
+    except BaseException as e:
+        for _, key, future in leading:
+            SYNTHESIS_FLIGHTS.finish(key, future, error=e)
+        raise
+    finally:
+        # Jobs skipped on cancel still have waiters; finish() ignores the others.
+        for _, key, future in leading:
+            SYNTHESIS_FLIGHTS.finish(key, future, False)
+    for (index, _, _), ok in zip(leading, outcomes):
+        if ok is None:
+            results[index] = None
+
+    for index, _, future in following:
+        if cancel is not None and cancel.is_set():
+            results[index] = None
+            continue
+        try:
+            ok = future.result()
+        except Exception as e:
+            print(f"Piper TTS (batch): shared synthesis failed: {e}")
+            ok = False
+        report(index, ok)
+    return results
+
+# --- Streaming Playback ---
+
+# First segment file -> its playback, until GTTSPlayer._on_done hands it to the player.
+PENDING_STREAMS: Dict[str, SegmentPlayback] = {}
+CURRENT_STREAM: Optional[SegmentPlayback] = None
+
+@timed("stream_gtts")
+def stream_gtts(text: str, lang: str, slow: bool, output_path: str, segment_base: str) -> Optional[str]:
+    """
+    Starts a gTTS download whose parts can be played while later ones are
+    still arriving. Returns the first segment file, or None on failure.
+    The complete audio is committed to output_path once the download ends.
+    If the same file is already being downloaded, waits for that instead
+    and returns output_path.
+    """
+    from gtts import gTTSError
+
+    key = synthesis_key("gTTS", text, lang, "slow" if slow else "normal", output_path)
+    flight, leader = SYNTHESIS_FLIGHTS.begin(key)
+    if not leader:
+        return output_path if flight.result() else None
+
+    conf = current_config()
+    timeout = conf.get("gtts_timeout_sec", 5)
+    gtts_stream = prepare_gtts(conf, text, lang, slow)
+    temp_output_path = make_temp_path(output_path)
+
+    playback = SegmentPlayback(
+        segment_base,
+        av_player,
+        lambda path: SoundOrVideoTag(filename=path),
+        mw.taskman.run_on_main
+    )
+
+    def on_finished(ok: bool):
+        if ok:
+            ok = PERSISTENT_CACHE.commit(temp_output_path, output_path, "gTTS")
+        SYNTHESIS_FLIGHTS.finish(key, flight, ok)
+        playback.finish(ok)
+
+    try:
+        started = GTTS_FETCHER.fetch_streaming(gtts_stream, temp_output_path, timeout, playback.add_part, on_finished)
+    except gTTSError as e:
+        print(f"gTTS API Error: {e}")
+        started = False
+    except Exception as e:
+        print(f"gTTS general error: {e}")
+        started = False
+    if not started:
+        SYNTHESIS_FLIGHTS.finish(key, flight, False)
+        return None
+
+    first = playback.first
+    PENDING_STREAMS[first] = playback
+    return first
+
+def start_stream_playback(first_segment: str) -> None:
+    """Called on the main thread once the first segment is in the player's queue."""
+    global CURRENT_STREAM
+    playback = PENDING_STREAMS.pop(first_segment, None)
+    if playback is None:
+        return
+    stop_stream_playback()
+    CURRENT_STREAM = playback
+    playback.attach()
+
+def stop_stream_playback() -> None:
+    global CURRENT_STREAM
+    if CURRENT_STREAM is not None:
+        CURRENT_STREAM.stop()
+        CURRENT_STREAM = None
+
+def on_av_player_will_play(tag: AVTag) -> None:
+    # Something else is playing now: don't queue the rest of the old text behind it.
+    if CURRENT_STREAM is not None and not CURRENT_STREAM.owns(tag):
+        stop_stream_playback()
+
+# --- Persistent Cache ---
+
+# One file per clip, or clips appended to pack files ("persistent_cache_backend": "packed").
+FILE_CACHE = PersistentCache()
+PACKED_CACHE = PackedCache()
+PERSISTENT_CACHE = FILE_CACHE
+
+# Set by configure_persistent_cache(); None uses Anki's temp folder.
+PERSISTENT_CACHE_DIR: Optional[str] = None
+
+def configure_persistent_cache(conf) -> None:
+    """Picks and opens the persistent cache backend once per config change."""
+    global PERSISTENT_CACHE, PERSISTENT_CACHE_DIR
+    PERSISTENT_CACHE_DIR = None
+    if conf.cache_dir is None:
+        return
+
+    backend = PACKED_CACHE if conf.get("persistent_cache_backend", "files") == "packed" else FILE_CACHE
+    if backend is not PERSISTENT_CACHE:
+        PERSISTENT_CACHE.flush()
+        PERSISTENT_CACHE = backend
+
+    try:
+        # Returns at once unless the directory or backend changed.
+        PERSISTENT_CACHE.configure(conf.cache_dir, conf.get("persistent_cache_max_mb", 1024))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error creating cache dir: {e}. Falling back to temp.")
+        return
+    PERSISTENT_CACHE_DIR = PERSISTENT_CACHE.cache_dir
+
+def cache_file_for(conf, tag: TTSTag, voice: "GTTSVoice", engine: str, anki_temp_full_path: str) -> str:
+    """
+    Where an engine's audio for a tag is cached. In the persistent cache the
+    name is derived from the normalized text, language, speed and engine,
+    so the same text reached through different tags shares one file.
+    """
+    ext = ".wav" if engine == "Piper" else ".mp3"
+    if PERSISTENT_CACHE_DIR is None:
+        return f"{anki_temp_full_path}{ext}"
+    if engine == "Piper":
+        # Piper only sees the language code and ignores speed.
+        key = content_key(tag.field_text, conf.voice(voice.gtts_lang).piper_lang, "", engine)
+    else:
+        key = content_key(tag.field_text, voice.gtts_lang, "slow" if tag.speed < 1 else "normal", engine)
+    return PERSISTENT_CACHE.path_for(key, ext)
+
+def select_engine(conf, text: str, gtts_lang: str, advance: bool = True) -> str:
+    """
+    Picks the primary TTS engine for a text. With cycling enabled, the
+    engine alternates per text; advance=False peeks without toggling.
+    """
+    enable_gtts_logic = conf.get("gtts_enabled", True)
+    enable_piper_logic = conf.get("piper_enabled", True)
+    default_engine = conf.get("tts_engine", "gTTS")
+    cycle_tts = conf.get("tts_cycle_enabled", False)
+
+    current_engine = default_engine
+
+    # Determine engine if cycling is requested and both engines are enabled
+    if cycle_tts and enable_gtts_logic and enable_piper_logic:
+        cache_key = (text, gtts_lang)
+
+        # Get state from memory or default
+        current_engine = TTS_CYCLE_STATE.get(cache_key, default_engine)
+
+        if advance:
+            # Toggle state for NEXT time
+            next_engine_val = "Piper" if current_engine == "gTTS" else "gTTS"
+            TTS_CYCLE_STATE.set(cache_key, next_engine_val)
+
+            print(f"TTS Cycle: Selected {current_engine}, next will be {next_engine_val}")
+
+    elif enable_gtts_logic and not enable_piper_logic:
+        current_engine = "gTTS"
+    elif not enable_gtts_logic and enable_piper_logic:
+        current_engine = "Piper"
+
+    return current_engine
+
+def synthesize_tag(
+    tag: TTSTag,
+    voice: "GTTSVoice",
+    anki_temp_full_path: str,
+    conf,
+    engine: str,
+    streaming: bool = False,
+    fallback: bool = True,
+    background: bool = False,
+) -> Optional[str]:
+    """
+    Returns a cached or freshly generated audio file for a tag, trying
+    `engine` first and, unless `fallback` is False, the other engine next.
+    With `streaming`, a gTTS download returns its first segment (see
+    stream_gtts). `background` is set for prefetch, which waits for a gTTS
+    download slot instead of taking playback's.
+    """
+    gtts_cache_file = cache_file_for(conf, tag, voice, "gTTS", anki_temp_full_path)
+    piper_cache_file = cache_file_for(conf, tag, voice, "Piper", anki_temp_full_path)
+
+    gtts_cache_enabled = conf.get("gtts_cache_enabled", True)
+    piper_cache_enabled = conf.get("piper_cache_enabled", False)
+
+    enable_gtts_logic = conf.get("gtts_enabled", True)
+    enable_piper_logic = conf.get("piper_enabled", True)
+
+    # -- Helpers --
+    @timed("try_gtts")
+    def try_gtts() -> Optional[str]:
+        if not enable_gtts_logic: return None
+        # Check cache
+        if gtts_cache_enabled and PERSISTENT_CACHE.lookup(gtts_cache_file):
+            STATS.count("gTTS", "hit")
+            return gtts_cache_file
+        # Download
+        slow = tag.speed < 1
+        if streaming:
+            first_segment = stream_gtts(tag.field_text, voice.gtts_lang, slow, gtts_cache_file, anki_temp_full_path)
+            if first_segment:
+                STATS.count("gTTS", "streamed")
+                return first_segment
+            STATS.count("gTTS", "failed")
+            return None
+        if generate_gtts(tag.field_text, voice.gtts_lang, slow, gtts_cache_file, background):
+            STATS.count("gTTS", "generated")
+            return gtts_cache_file
+        STATS.count("gTTS", "failed")
+        return None
+
+    @timed("try_piper")
+    def try_piper() -> Optional[str]:
+        if not enable_piper_logic: return None
+        # Check cache
+        if piper_cache_enabled and PERSISTENT_CACHE.lookup(piper_cache_file):
+            STATS.count("Piper", "hit")
+            return piper_cache_file
+        # Generate
+        if generate_piper(tag.field_text, conf.voice(voice.gtts_lang).piper_lang, piper_cache_file):
+            STATS.count("Piper", "generated")
+            return piper_cache_file
+        STATS.count("Piper", "failed")
+        return None
+
+    # -- Execution with Cross-Failover --
+    if engine == "Piper":
+        # Target: Piper -> Fallback: gTTS
+        result = try_piper()
+        if not result and fallback:
+            print("Piper failed. Attempting fallback to gTTS...")
+            STATS.count("Fallback", "Piper -> gTTS")
+            result = try_gtts()
+            if not result:
+                print("Both Piper and gTTS failed or are disabled.")
+    else:
+        # Target: gTTS -> Fallback: Piper
+        result = try_gtts()
+        if not result and fallback:
+            if enable_gtts_logic:
+                print("gTTS failed/timeout, falling back to Piper...")
+            else:
+                print("gTTS disabled, falling back to Piper...")
+
+            STATS.count("Fallback", "gTTS -> Piper")
+            result = try_piper()
+            if not result:
+                print("Fallback to Piper also failed.")
+    return result
+
 @dataclass
 class GTTSVoice(TTSVoice):
     gtts_lang: str
 
+GTTS_VOICES: Optional[List[TTSVoice]] = None
+
+def gtts_voices() -> List[TTSVoice]:
+    """The gTTS voice list; it only depends on the vendored language table, so it is built once."""
+    global GTTS_VOICES
+    if GTTS_VOICES is not None:
+        return GTTS_VOICES
+    voices = []
+    for code, name in tts_langs().items():
+        if "-" in code:
+            head, tail = code.split("-")
+            std_code = f"{head}_{tail.upper()}"
+        else:
+            std_code = compatMap.get(code)
+            if not std_code:
+                continue
+
+        if std_code == "en_US":
+            std_code = "en_GB"
+
+        voices.append(GTTSVoice(name="gTTS", lang=std_code, gtts_lang=code))
+    GTTS_VOICES = voices
+    return voices
+
 class GTTSPlayer(TTSProcessPlayer):
     def get_available_voices(self) -> List[TTSVoice]:
-        voices = []
-        for code, name in tts_langs().items():
-            if "-" in code:
-                head, tail = code.split("-")
-                std_code = f"{head}_{tail.upper()}"
-            else:
-                std_code = compatMap.get(code)
-                if not std_code:
-                    continue
-            
-            if std_code == "en_US":
-                std_code = "en_GB"
-
-            voices.append(GTTSVoice(name="gTTS", lang=std_code, gtts_lang=code))
-        return voices
+        return list(gtts_voices())
 
+    @timed("play")
     def _play(self, tag: AVTag) -> None:
         assert isinstance(tag, TTSTag)
         match = self.voice_for_tag(tag)
@@ -262,38 +790,10 @@ class GTTSPlayer(TTSProcessPlayer):
         if not tag.field_text.strip():
             return
 
-        conf = get_config()
+        conf = current_config()
         
         # --- PATH DETERMINATION ---
-        persistent_enabled = conf.get("persistent_cache_enabled", False)
-        custom_path = conf.get("persistent_cache_path", "").strip()
-        
         anki_temp_full_path = self.temp_file_for_tag_and_voice(tag, match.voice)
-        
-        if persistent_enabled:
-            if custom_path:
-                cache_dir = custom_path
-            else:
-                addon_dir = os.path.dirname(__file__)
-                cache_dir = os.path.join(addon_dir, "user_cache")
-            
-            if not os.path.exists(cache_dir):
-                try:
-                    os.makedirs(cache_dir, exist_ok=True)
-                except OSError as e:
-                    print(f"Error creating cache dir: {e}. Falling back to temp.")
-                    base_filename = anki_temp_full_path
-                else:
-                    filename_only = os.path.basename(anki_temp_full_path)
-                    base_filename = os.path.join(cache_dir, filename_only)
-            else:
-                filename_only = os.path.basename(anki_temp_full_path)
-                base_filename = os.path.join(cache_dir, filename_only)
-        else:
-            base_filename = anki_temp_full_path
-
-        gtts_cache_file = f"{base_filename}.mp3"
-        piper_cache_file = f"{base_filename}.wav"
 
         self._tmpfile = None
 
@@ -304,90 +804,11 @@ class GTTSPlayer(TTSProcessPlayer):
             return
 
         # --- PRIORITY 2 & 3: TTS LOGIC (gTTS / Piper) ---
-        gtts_cache_enabled = conf.get("gtts_cache_enabled", True)
-        piper_cache_enabled = conf.get("piper_cache_enabled", False)
-        
-        enable_gtts_logic = conf.get("gtts_enabled", True)
-        enable_piper_logic = conf.get("piper_enabled", True)
-
-        # -- Helpers --
-        def try_gtts():
-            if not enable_gtts_logic: return False
-            # Check cache
-            if gtts_cache_enabled and os.path.exists(gtts_cache_file):
-                if os.path.getsize(gtts_cache_file) > 0:
-                    self._tmpfile = gtts_cache_file
-                    return True
-                else:
-                    try: os.remove(gtts_cache_file)
-                    except: pass
-            # Download
-            slow = tag.speed < 1
-            if run_gtts_with_timeout(tag.field_text, voice.gtts_lang, slow, gtts_cache_file):
-                self._tmpfile = gtts_cache_file
-                return True
-            return False
-        
-        def try_piper():
-            if not enable_piper_logic: return False
-            # Check cache
-            if piper_cache_enabled and os.path.exists(piper_cache_file):
-                if os.path.getsize(piper_cache_file) > 0:
-                    self._tmpfile = piper_cache_file
-                    return True
-                else:
-                    try: os.remove(piper_cache_file)
-                    except: pass
-            # Generate
-            if run_piper_tts(tag.field_text, voice.lang, piper_cache_file):
-                self._tmpfile = piper_cache_file
-                return True
-            return False
-
-        # -- Engine Selection (Standard vs Cycling) --
-        default_engine = conf.get("tts_engine", "gTTS")
-        cycle_tts = conf.get("tts_cycle_enabled", False)
-        
-        current_engine = default_engine
-        
-        # Determine engine if cycling is requested and both engines are enabled
-        if cycle_tts and enable_gtts_logic and enable_piper_logic:
-            cache_key = (tag.field_text, voice.gtts_lang)
-            
-            # Get state from memory or default
-            if cache_key in TTS_CYCLE_STATE:
-                current_engine = TTS_CYCLE_STATE[cache_key]
-            else:
-                current_engine = default_engine
-            
-            # Toggle state for NEXT time
-            next_engine_val = "Piper" if current_engine == "gTTS" else "gTTS"
-            TTS_CYCLE_STATE[cache_key] = next_engine_val
-            
-            print(f"TTS Cycle: Selected {current_engine}, next will be {next_engine_val}")
-            
-        elif enable_gtts_logic and not enable_piper_logic:
-            current_engine = "gTTS"
-        elif not enable_gtts_logic and enable_piper_logic:
-            current_engine = "Piper"
-
-        # -- Execution with Cross-Failover --
-        if current_engine == "Piper":
-            # Target: Piper -> Fallback: gTTS
-            if not try_piper():
-                print("Piper failed. Attempting fallback to gTTS...")
-                if not try_gtts():
-                    print("Both Piper and gTTS failed or are disabled.")
-        else:
-            # Target: gTTS -> Fallback: Piper
-            if not try_gtts():
-                if enable_gtts_logic:
-                    print("gTTS failed/timeout, falling back to Piper...")
-                else:
-                    print("gTTS disabled, falling back to Piper...")
-                
-                if not try_piper():
-                    print("Fallback to Piper also failed.")
+        current_engine = select_engine(conf, tag.field_text, voice.gtts_lang)
+        self._tmpfile = synthesize_tag(
+            tag, voice, anki_temp_full_path, conf, current_engine,
+            streaming=conf.get("gtts_streaming_enabled", False)
+        )
     
     def _on_done(self, ret: Future, cb: OnDoneCallback) -> None:
         if not hasattr(self, "_tmpfile") or not self._tmpfile:
@@ -401,12 +822,347 @@ class GTTSPlayer(TTSProcessPlayer):
                 print(f"Error in future: {e}")
 
         av_player.insert_file(self._tmpfile)
+        start_stream_playback(self._tmpfile)
         cb()
 
     def stop(self):
         pass
 
-av_player.players.append(GTTSPlayer(mw.taskman))
+PLAYER = GTTSPlayer(mw.taskman)
+av_player.players.append(PLAYER)
+
+# --- Look-ahead Prefetch ---
+
+def cacheable_engines(conf) -> List[str]:
+    """Enabled engines whose output playback reads back from the cache."""
+    cacheable = []
+    if conf.get("gtts_enabled", True) and conf.get("gtts_cache_enabled", True):
+        cacheable.append("gTTS")
+    if conf.get("piper_enabled", True) and conf.get("piper_cache_enabled", False):
+        cacheable.append("Piper")
+    return cacheable
+
+PREFETCHER = Prefetcher()
+
+def prefetch_voice(tag: TTSTag) -> Optional[GTTSVoice]:
+    match = PLAYER.voice_for_tag(tag)
+    if not match:
+        return None
+    if tag.voices and match.rank == -100:
+        # Only a language match; the tag asked for another player's voices.
+        return None
+    return cast(GTTSVoice, match.voice)
+
+@outside_playback("prefetch")
+def prefetch_tag(tag: TTSTag) -> None:
+    """
+    Warms the cache for a tag without playing it or advancing any cycle
+    state. Engines whose output playback would not read from the cache
+    are skipped, so prefetch never doubles the requests.
+    """
+    voice = prefetch_voice(tag)
+    if voice is None:
+        return
+    conf = current_config()
+
+    cache_data = lookup_audio_dictionary(tag.field_text, voice.gtts_lang, conf)
+    if cache_data and cache_data["files"]:
+        return
+
+    cacheable = cacheable_engines(conf)
+    engine = select_engine(conf, tag.field_text, voice.gtts_lang, advance=False)
+    if engine not in cacheable:
+        return
+    fallback = ("gTTS" if engine == "Piper" else "Piper") in cacheable
+    anki_temp_full_path = PLAYER.temp_file_for_tag_and_voice(tag, voice)
+    synthesize_tag(tag, voice, anki_temp_full_path, conf, engine, fallback=fallback, background=True)
+
+@outside_playback("prefetch")
+def prefetch_piper_tags(tags: List[TTSTag]) -> None:
+    """
+    Warms the cache for tags that play with Piper using one batched Piper
+    run. Tags Piper could not synthesize are fetched from gTTS instead.
+    """
+    conf = current_config()
+    pending = []
+    for tag in tags:
+        voice = prefetch_voice(tag)
+        if voice is None:
+            continue
+        cache_data = lookup_audio_dictionary(tag.field_text, voice.gtts_lang, conf)
+        if cache_data and cache_data["files"]:
+            continue
+        anki_temp_full_path = PLAYER.temp_file_for_tag_and_voice(tag, voice)
+        piper_cache_file = cache_file_for(conf, tag, voice, "Piper", anki_temp_full_path)
+        if PERSISTENT_CACHE.lookup(piper_cache_file):
+            STATS.count("Piper", "hit")
+            continue
+        pending.append((tag, voice, anki_temp_full_path, piper_cache_file))
+
+    outcomes = generate_piper_batch([
+        (tag.field_text, conf.voice(voice.gtts_lang).piper_lang, path) for tag, voice, _, path in pending
+    ])
+    for (tag, voice, anki_temp_full_path, _), ok in zip(pending, outcomes):
+        if ok:
+            STATS.count("Piper", "generated")
+            continue
+        STATS.count("Piper", "failed")
+        if "gTTS" not in cacheable_engines(conf):
+            continue
+        STATS.count("Fallback", "Piper -> gTTS")
+        gtts_cache_file = cache_file_for(conf, tag, voice, "gTTS", anki_temp_full_path)
+        if PERSISTENT_CACHE.lookup(gtts_cache_file):
+            STATS.count("gTTS", "hit")
+            continue
+        if generate_gtts(tag.field_text, voice.gtts_lang, tag.speed < 1, gtts_cache_file, background=True):
+            STATS.count("gTTS", "generated")
+        else:
+            STATS.count("gTTS", "failed")
+
+def prefetch_tags(tags: List[AVTag]) -> None:
+    """
+    Replaces the pending prefetch batch with the TTS tags in `tags`. Tags
+    that would play with Piper are warmed together in one batched job
+    (only when Piper's output is cached, see prefetch_tag).
+    """
+    conf = current_config()
+    PREFETCHER.configure(
+        conf.get("prefetch_workers", 2),
+        conf.get("prefetch_max_in_flight", 4)
+    )
+    jobs = []
+    piper_tags = []
+    piper_keys = []
+    piper_position = 0
+    for tag in tags:
+        if not isinstance(tag, TTSTag) or not tag.field_text.strip():
+            continue
+        key = (tag.field_text, tag.lang, tag.speed, tuple(tag.voices))
+        voice = prefetch_voice(tag)
+        if (voice is not None and "Piper" in cacheable_engines(conf)
+                and select_engine(conf, tag.field_text, voice.gtts_lang, advance=False) == "Piper"):
+            if not piper_tags:
+                piper_position = len(jobs)
+            piper_tags.append(tag)
+            piper_keys.append(key)
+            continue
+        jobs.append((key, lambda tag=tag: prefetch_tag(tag)))
+
+    if len(piper_tags) == 1:
+        jobs.insert(piper_position, (piper_keys[0], lambda: prefetch_tag(piper_tags[0])))
+    elif piper_tags:
+        jobs.insert(piper_position, (("Piper batch",) + tuple(piper_keys), lambda: prefetch_piper_tags(piper_tags)))
+    PREFETCHER.submit(jobs)
+
+def upcoming_tts_tags(card, count: int) -> List[AVTag]:
+    """The current card's answer tags followed by the tags of the next `count` queued cards."""
+    tags = list(card.answer_av_tags())
+    try:
+        queued = mw.col.sched.get_queued_cards(fetch_limit=count + 1)
+    except Exception as e:
+        # Older schedulers have no queue preview.
+        print(f"Prefetch: cannot read review queue: {e}")
+        return tags
+    for queued_card in queued.cards:
+        if queued_card.card.id == card.id:
+            continue
+        next_card = mw.col.get_card(queued_card.card.id)
+        tags.extend(next_card.question_av_tags())
+        tags.extend(next_card.answer_av_tags())
+    return tags
+
+# Bumped for every shown question, so a slow collection for an older card is dropped.
+PREFETCH_REQUEST = 0
+
+def on_reviewer_did_show_question(card) -> None:
+    global PREFETCH_REQUEST
+    conf = current_config()
+    if not conf.get("prefetch_enabled", False):
+        return
+    PREFETCH_REQUEST += 1
+    request = PREFETCH_REQUEST
+    count = conf.get("prefetch_cards", 3)
+
+    def collect() -> None:
+        # Rendering the next cards' tags is collection work; keep it off the UI thread.
+        try:
+            tags = upcoming_tts_tags(card, count)
+        except Exception as e:
+            print(f"Prefetch: cannot read upcoming cards: {e}")
+            return
+        if request == PREFETCH_REQUEST:
+            prefetch_tags(tags)
+
+    mw.taskman.run_in_background(collect)
+
+# --- Bulk Pre-render ---
+
+def prerender_engines(conf, text: str, gtts_lang: str) -> List[str]:
+    """Engines whose output for a text would be played from cache."""
+    cacheable = cacheable_engines(conf)
+    if conf.get("tts_cycle_enabled", False) and conf.get("gtts_enabled", True) and conf.get("piper_enabled", True):
+        return cacheable
+    engine = select_engine(conf, text, gtts_lang, advance=False)
+    return [engine] if engine in cacheable else []
+
+def make_render_job(key: tuple, engine: str, tag: TTSTag, voice: GTTSVoice, settings: VoiceSettings, output_path: str) -> RenderJob:
+    item = None
+    if engine == "Piper":
+        render = lambda: generate_piper(tag.field_text, settings.piper_lang, output_path)
+        item = (tag.field_text, settings.piper_lang, output_path)
+    else:
+        render = lambda: generate_gtts(tag.field_text, voice.gtts_lang, tag.speed < 1, output_path, background=True)
+    return RenderJob(
+        key=key,
+        engine=engine,
+        is_cached=lambda: PERSISTENT_CACHE.lookup(output_path),
+        render=outside_playback("pre-render")(render),
+        item=item
+    )
+
+def build_render_jobs(tags: List[AVTag], conf) -> List[RenderJob]:
+    """One job per unique (text, lang, speed, engine) not covered by the audio dictionary."""
+    jobs = []
+    seen = set()
+    for tag in tags:
+        if not isinstance(tag, TTSTag) or not tag.field_text.strip():
+            continue
+        voice = prefetch_voice(tag)
+        if voice is None:
+            continue
+
+        cache_data = lookup_audio_dictionary(tag.field_text, voice.gtts_lang, conf)
+        if cache_data and cache_data["files"]:
+            continue
+
+        for engine in prerender_engines(conf, tag.field_text, voice.gtts_lang):
+            key = (tag.field_text, voice.gtts_lang, tag.speed, engine)
+            if key in seen:
+                continue
+            seen.add(key)
+            anki_temp_full_path = PLAYER.temp_file_for_tag_and_voice(tag, voice)
+            output_path = cache_file_for(conf, tag, voice, engine, anki_temp_full_path)
+            jobs.append(make_render_job(key, engine, tag, voice, conf.voice(voice.gtts_lang), output_path))
+    return jobs
+
+def collect_tts_tags(search: str) -> List[AVTag]:
+    tags: List[AVTag] = []
+    for card_id in mw.col.find_cards(search):
+        card = mw.col.get_card(card_id)
+        tags.extend(card.question_av_tags())
+        tags.extend(card.answer_av_tags())
+    return tags
+
+def prerender_search(search: str, progress=None, cancel: Optional[threading.Event] = None) -> RenderReport:
+    """
+    Renders missing TTS audio for all cards matching an Anki search.
+    Can be called without any UI; re-running skips files already cached.
+    """
+    conf = current_config()
+    jobs = build_render_jobs(collect_tts_tags(search), conf)
+    return render_jobs(
+        jobs,
+        workers={
+            "gTTS": conf.get("prerender_gtts_workers", 4),
+            "Piper": conf.get("prerender_piper_workers", 2),
+        },
+        rate_limits={"gTTS": conf.get("prerender_gtts_requests_per_sec", 2)},
+        progress=progress,
+        cancel=cancel,
+        batch_render={"Piper": outside_playback("pre-render")(
+            lambda batch, on_result, cancel: generate_piper_batch([job.item for job in batch], on_result, cancel)
+        )},
+        batch_size=conf.get("prerender_piper_batch_size", 50)
+    )
+
+def on_prerender_action():
+    search, ok = getText(
+        "Pre-render TTS audio for cards matching this search:",
+        parent=mw,
+        default="deck:current",
+        title="Pre-render TTS Audio"
+    )
+    if not ok or not search.strip():
+        return
+
+    cancel = threading.Event()
+
+    def on_progress(done: int, total: int):
+        def update():
+            if mw.progress.want_cancel():
+                cancel.set()
+            mw.progress.update(label=f"Pre-rendering TTS audio: {done}/{total}", value=done, max=total)
+        mw.taskman.run_on_main(update)
+
+    def on_done(fut: Future):
+        try:
+            report = fut.result()
+        except Exception as e:
+            showInfo(f"Pre-render failed: {e}")
+            return
+        print(f"Pre-render finished:\n{report.summary()}")
+        showInfo(report.summary(), title="Pre-render TTS Audio")
+
+    mw.taskman.with_progress(
+        lambda: prerender_search(search, on_progress, cancel),
+        on_done,
+        label="Collecting TTS fields..."
+    )
+
+def format_stats_report() -> str:
+    lines = [STATS.to_text(), "", "Memory caches:"]
+    for name, cache_stats in memory_cache_stats().items():
+        lines.append(f"  {name}: " + ", ".join(f"{k}: {v}" for k, v in cache_stats.items()))
+    lines.append("")
+    lines.append("Synthesis in flight: " + ", ".join(f"{k}: {v}" for k, v in SYNTHESIS_FLIGHTS.stats().items()))
+    if PERSISTENT_CACHE.cache_dir:
+        lines.append("")
+        lines.append("Persistent cache: " + ", ".join(f"{k}: {v}" for k, v in PERSISTENT_CACHE.stats().items()))
+    if not STATS.enabled:
+        lines.append("")
+        lines.append("Timing is off. Set \"stats_enabled\": true in the add-on config to collect it.")
+    return "\n".join(lines)
+
+def export_stats(parent, fmt: str) -> None:
+    path, _ = QFileDialog.getSaveFileName(parent, "Export TTS Stats", f"tts_stats.{fmt}", f"{fmt.upper()} (*.{fmt})")
+    if not path:
+        return
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(STATS.to_json() if fmt == "json" else STATS.to_csv())
+
+def show_stats_dialog():
+    dialog = QDialog(mw)
+    dialog.setWindowTitle("TTS Playback Stats")
+    dialog.resize(760, 480)
+
+    text = QPlainTextEdit(dialog)
+    text.setReadOnly(True)
+    text.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+
+    def refresh():
+        text.setPlainText(format_stats_report())
+
+    def reset():
+        STATS.reset()
+        refresh()
+
+    buttons = QHBoxLayout()
+    for label, handler in (
+        ("Refresh", refresh),
+        ("Reset", reset),
+        ("Export JSON...", lambda: export_stats(dialog, "json")),
+        ("Export CSV...", lambda: export_stats(dialog, "csv")),
+        ("Close", dialog.close),
+    ):
+        button = QPushButton(label, dialog)
+        qconnect(button.clicked, handler)
+        buttons.addWidget(button)
+
+    layout = QVBoxLayout(dialog)
+    layout.addWidget(text)
+    layout.addLayout(buttons)
+    refresh()
+    dialog.show()
 
 def switch_tts_engine():
     conf = get_config()
@@ -417,13 +1173,41 @@ def switch_tts_engine():
     action.setText(f"TTS Engine: {new_engine}")
     showInfo(f"TTS engine switched to: {new_engine}")
 
+def on_config_updated(new_config):
+    """Called by Anki after the config was edited in the add-on manager."""
+    conf = refresh_config(new_config)
+    action.setText(f"TTS Engine: {conf.get('tts_engine', 'gTTS')}")
+
 def setup_menu():
     global action
     action = QAction(mw)
     mw.form.menuTools.addAction(action)
-    conf = get_config()
+    conf = current_config()
     engine = conf.get("tts_engine", "gTTS")
     action.setText(f"TTS Engine: {engine}")
     qconnect(action.triggered, switch_tts_engine)
 
-setup_menu()
\ No newline at end of file
+    prerender_action = QAction("Pre-render TTS Audio...", mw)
+    mw.form.menuTools.addAction(prerender_action)
+    qconnect(prerender_action.triggered, on_prerender_action)
+
+    stats_action = QAction("TTS Playback Stats...", mw)
+    mw.form.menuTools.addAction(stats_action)
+    qconnect(stats_action.triggered, show_stats_dialog)
+
+setup_menu()
+
+gui_hooks.profile_will_close.append(PIPER_WORKERS.shutdown)
+gui_hooks.profile_will_close.append(PREFETCHER.shutdown)
+gui_hooks.profile_will_close.append(FILE_CACHE.flush)
+gui_hooks.profile_will_close.append(PACKED_CACHE.close)
+gui_hooks.reviewer_did_show_question.append(on_reviewer_did_show_question)
+gui_hooks.reviewer_will_end.append(PREFETCHER.cancel)
+gui_hooks.reviewer_will_end.append(stop_stream_playback)
+if hasattr(gui_hooks, "av_player_will_play"):
+    gui_hooks.av_player_will_play.append(on_av_player_will_play)
+
+mw.addonManager.setConfigUpdatedAction(__name__, on_config_updated)
+
+if current_config().get("audio_dictionary_enabled", False):
+    get_audio_index(current_config())
\ No newline at end of file
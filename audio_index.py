@@ -0,0 +1,261 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS entries (
+    folder TEXT,
+    word TEXT,
+    dir TEXT,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_lookup ON entries (folder, word);
+CREATE INDEX IF NOT EXISTS entries_dir ON entries (dir);
+CREATE TABLE IF NOT EXISTS empty_files (
+    dir TEXT,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS empty_files_dir ON empty_files (dir);
+"""
+
+# Bump when the meaning of stored rows changes, so old indexes are rebuilt.
+INDEX_VERSION = 2
+
+
+def normalize_folder(folder: str) -> str:
+    folder = folder.replace("\\", "/").strip("/")
+    return os.path.normcase(folder)
+
+
+def normalize_name(name: str) -> str:
+    # Case-insensitive only where the platform's paths are, like glob.
+    return os.path.normcase(name)
+
+
+def any_filled(paths: List[str]) -> bool:
+    """True if any of these files, empty when last indexed, has content now or is gone."""
+    for path in paths:
+        try:
+            if os.stat(path).st_size > 0:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+class AudioDictionaryIndex:
+    """
+    Persistent index of the local audio dictionary.
+
+    Maps (language folder, file name) to the recordings found in
+    <root>/<folder>/<speaker>/<name>.mp3, i.e. the same files the old
+    glob lookup returned, with exclusions and empty files filtered out
+    at index time. Names match case-insensitively only on Windows, as
+    glob does. Directory mtimes are stored so a refresh only rescans
+    directories whose contents changed; empty files are stored too and
+    rechecked on every refresh, since filling one does not touch the
+    directory's mtime.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.root = ""
+        self.exclusions: List[str] = []
+        self.ready = False
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def configure(self, root: str, exclusions: List[str]) -> None:
+        """Point the index at a dictionary root. Changing root or exclusions drops the old index."""
+        root = os.path.normpath(root)
+        exclusions = list(exclusions or [])
+        if root == self.root and exclusions == self.exclusions and self._conn is not None:
+            return
+        with self._lock:
+            conn = self._connect()
+            signature = json.dumps({"root": root, "exclusions": exclusions, "version": INDEX_VERSION})
+            if self._get_meta("signature") != signature:
+                conn.execute("DELETE FROM entries")
+                conn.execute("DELETE FROM dirs")
+                conn.execute("DELETE FROM empty_files")
+                self._set_meta("signature", signature)
+                self._set_meta("complete", "0")
+            conn.commit()
+            self.root = root
+            self.exclusions = exclusions
+            self.ready = self._get_meta("complete") == "1"
+
+    def lookup(self, folder: str, name: str) -> Optional[List[str]]:
+        """
+        Returns the sorted recordings for a file name in a language folder,
+        or None when the index has not finished its first build yet.
+        """
+        if not self.ready:
+            return None
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT path FROM entries WHERE folder = ? AND word = ? ORDER BY path",
+                (normalize_folder(folder), normalize_name(name)),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def refresh_async(self, min_interval: float = 0) -> None:
+        """Starts a background refresh unless one is running or the last one is too recent."""
+        if not self.root:
+            return
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        if min_interval and time.time() - self.last_refresh < min_interval:
+            return
+        self.last_refresh = time.time()
+        self._refresh_thread = threading.Thread(target=self._refresh_job, daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh_job(self) -> None:
+        try:
+            start = time.time()
+            changed = self.refresh()
+            print(f"Audio Dictionary Index: refreshed in {time.time() - start:.2f}s ({changed} directories rescanned)")
+        except Exception as e:
+            print(f"Audio Dictionary Index: refresh failed: {e}")
+
+    def refresh(self) -> int:
+        """
+        Brings the index up to date with the dictionary on disk.
+        Returns the number of directories that had to be rescanned.
+        """
+        root = self.root
+        if not root or not os.path.isdir(root):
+            return 0
+
+        known: Dict[str, float] = {}
+        children: Dict[str, List[str]] = {}
+        empty: Dict[str, List[str]] = {}
+        with self._lock:
+            conn = self._connect()
+            for path, parent, mtime in conn.execute("SELECT path, parent, mtime FROM dirs"):
+                known[path] = mtime
+                if parent is not None:
+                    children.setdefault(parent, []).append(path)
+            for rel_dir, path in conn.execute("SELECT dir, path FROM empty_files"):
+                empty.setdefault(rel_dir, []).append(path)
+
+        rescanned = 0
+        pending = [""]
+        while pending:
+            if self.root != root:
+                # Reconfigured while refreshing; the new root gets its own refresh.
+                return rescanned
+            rel_dir = pending.pop()
+            abs_dir = os.path.join(root, rel_dir) if rel_dir else root
+            try:
+                mtime = os.stat(abs_dir).st_mtime
+            except OSError:
+                continue
+
+            if known.get(rel_dir) == mtime and not any_filled(empty.get(rel_dir, [])):
+                # Contents unchanged: reuse the stored child directories without listing.
+                pending.extend(children.get(rel_dir, []))
+                continue
+
+            subdirs = self._rescan_dir(rel_dir, abs_dir, mtime, known, children)
+            rescanned += 1
+            pending.extend(subdirs)
+
+        with self._lock:
+            self._set_meta("complete", "1")
+            self._connect().commit()
+        self.ready = True
+        return rescanned
+
+    def _rescan_dir(
+        self,
+        rel_dir: str,
+        abs_dir: str,
+        mtime: float,
+        known: Dict[str, float],
+        children: Dict[str, List[str]],
+    ) -> List[str]:
+        subdirs = []
+        rows = []
+        empty_paths = []
+        folder = normalize_folder(os.path.dirname(rel_dir)) if rel_dir else ""
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(os.path.join(rel_dir, entry.name) if rel_dir else entry.name)
+                            continue
+                        if not folder or not normalize_name(entry.name).endswith(".mp3"):
+                            continue
+                        if self.exclusions and any(ex in entry.path for ex in self.exclusions):
+                            continue
+                        if entry.stat().st_size > 0:
+                            rows.append((folder, normalize_name(entry.name[:-4]), rel_dir, entry.path))
+                        else:
+                            empty_paths.append((rel_dir, entry.path))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Audio Dictionary Index: cannot list '{abs_dir}': {e}")
+            return []
+
+        parent = os.path.dirname(rel_dir) if rel_dir else None
+        removed = set(children.get(rel_dir, [])) - set(subdirs)
+
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries WHERE dir = ?", (rel_dir,))
+            conn.executemany("INSERT INTO entries (folder, word, dir, path) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("DELETE FROM empty_files WHERE dir = ?", (rel_dir,))
+            conn.executemany("INSERT INTO empty_files (dir, path) VALUES (?, ?)", empty_paths)
+            for path in removed:
+                self._drop_subtree(path, known, children)
+            conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, parent, mtime) VALUES (?, ?, ?)",
+                (rel_dir, parent, mtime),
+            )
+            conn.commit()
+        known[rel_dir] = mtime
+        children[rel_dir] = subdirs
+        return subdirs
+
+    def _drop_subtree(self, rel_dir: str, known: Dict[str, float], children: Dict[str, List[str]]) -> None:
+        conn = self._connect()
+        for child in children.pop(rel_dir, []):
+            self._drop_subtree(child, known, children)
+        conn.execute("DELETE FROM entries WHERE dir = ?", (rel_dir,))
+        conn.execute("DELETE FROM empty_files WHERE dir = ?", (rel_dir,))
+        conn.execute("DELETE FROM dirs WHERE path = ?", (rel_dir,))
+        known.pop(rel_dir, None)
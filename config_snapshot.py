@@ -0,0 +1,75 @@
+import copy
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+
+
+@dataclass(frozen=True)
+class VoiceSettings:
+    """What playback derives from a voice's language, resolved once per config."""
+    gtts_lang: str
+    piper_lang: str
+    dictionary_folder: str
+
+
+def dictionary_folder_for(lang: str, lang_map: Mapping[str, str]) -> str:
+    """The audio dictionary sub-folder for a language: the lang map entry, else the short code."""
+    default_short = lang.split('_')[0] if '_' in lang else lang
+    if lang in lang_map:
+        return lang_map[lang]
+    return lang_map.get(default_short, default_short)
+
+
+class ConfigSnapshot(Mapping):
+    """
+    Read-only copy of the add-on config as of its last change.
+
+    Behaves like the config dict for reading (`conf.get(key, default)`)
+    and additionally carries values the playback path would otherwise
+    derive on every play: the dictionary root and exclusions, the cache
+    directory, and a per-language VoiceSettings table.
+    """
+
+    def __init__(self, raw: Mapping[str, Any], voices: Iterable = (), default_cache_dir: str = ""):
+        self._data = MappingProxyType(copy.deepcopy(dict(raw)))
+
+        # Empty unless the folder exists now, so lookups never check it themselves.
+        root = self._data.get("audio_dictionary_path", "").strip()
+        self.dictionary_root: str = root if root and os.path.isdir(root) else ""
+        self.dictionary_exclusions: List[str] = list(self._data.get("audio_dictionary_exclusions", []))
+        self._lang_map: Dict[str, str] = dict(self._data.get("audio_dictionary_lang_map", {}))
+
+        # The persistent cache directory, or None to use Anki's temp folder.
+        self.cache_dir: Optional[str] = None
+        if self._data.get("persistent_cache_enabled", False):
+            custom_path = self._data.get("persistent_cache_path", "").strip()
+            self.cache_dir = os.path.normpath(custom_path or default_cache_dir)
+
+        self._voices: Dict[str, VoiceSettings] = {}
+        for voice in voices:
+            self._voices[voice.gtts_lang] = VoiceSettings(
+                gtts_lang=voice.gtts_lang,
+                piper_lang=voice.lang.split("_")[0],
+                dictionary_folder=dictionary_folder_for(voice.gtts_lang, self._lang_map),
+            )
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def voice(self, gtts_lang: str) -> VoiceSettings:
+        """Settings for a gTTS language code; codes outside the voice list are resolved on the fly."""
+        settings = self._voices.get(gtts_lang)
+        if settings is None:
+            settings = VoiceSettings(
+                gtts_lang=gtts_lang,
+                piper_lang=gtts_lang.replace("-", "_").split("_")[0],
+                dictionary_folder=dictionary_folder_for(gtts_lang, self._lang_map),
+            )
+        return settings
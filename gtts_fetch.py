@@ -0,0 +1,246 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Callable, Iterable, Optional
+
+from .persistent_cache import remove_quietly
+
+
+class FetchCancelled(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `cooldown` seconds. After the cool-down one trial call is let through;
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._open_until = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.failures < self.threshold:
+                return True
+            if time.monotonic() < self._open_until or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+
+    def abort_trial(self) -> None:
+        """Gives up a call that allow() let through without running it, so the next one may try."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold:
+                self._open_until = time.monotonic() + self.cooldown
+
+    def remaining(self) -> float:
+        return max(0.0, self._open_until - time.monotonic())
+
+
+class GTTSFetcher:
+    """
+    Runs gTTS downloads on a bounded executor.
+
+    fetch() waits at most `timeout` seconds. A download that overruns is
+    cancelled: it stops at the next audio part and its temp file is
+    deleted, so a late result can never overwrite anything. Socket
+    timeouts inside gTTS bound how long such a thread can still live.
+
+    Playback never waits for a download slot. Background downloads
+    (prefetch, pre-render) wait up to BACKGROUND_WAIT seconds for one and
+    leave the last slot to playback.
+    """
+
+    BACKGROUND_WAIT = 60
+
+    def __init__(self, max_outstanding: int = 4, failure_threshold: int = 3, cooldown: float = 60):
+        self.max_outstanding = max(1, max_outstanding)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self._outstanding = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+
+    def configure(self, max_outstanding: int, failure_threshold: int, cooldown: float) -> None:
+        with self._lock:
+            max_outstanding = max(1, max_outstanding)
+            if max_outstanding != self.max_outstanding and self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self.max_outstanding = max_outstanding
+        self.breaker.threshold = failure_threshold
+        self.breaker.cooldown = cooldown
+
+    def fetch(
+        self,
+        stream_factory: Callable[[], Iterable[bytes]],
+        temp_path: str,
+        timeout: float,
+        background: bool = False,
+    ) -> Optional[bool]:
+        """
+        Writes the streamed audio to temp_path. Returns False on timeout
+        and None if the download was not attempted (no free slot, or the
+        circuit is open); re-raises errors from gTTS.
+        """
+        cancel = threading.Event()
+        future = self._submit(stream_factory, temp_path, cancel, background=background)
+        if future is None:
+            return None
+        try:
+            future.result(timeout=timeout)
+        except TimeoutError:
+            cancel.set()
+            # Whatever the job still writes is discarded once it stops.
+            future.add_done_callback(lambda _: remove_quietly(temp_path))
+            self.breaker.record_failure()
+            print(f"gTTS timed out after {timeout} seconds.")
+            return False
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return True
+
+    def fetch_streaming(
+        self,
+        stream_factory: Callable[[], Iterable[bytes]],
+        temp_path: str,
+        timeout: float,
+        on_part: Callable[[int, bytes], None],
+        on_finished: Callable[[bool], None],
+    ) -> bool:
+        """
+        Like fetch(), but returns as soon as the first audio part has been
+        passed to on_part(index, data), waiting at most `timeout` seconds.
+        The download then continues in the background; on_finished(ok) is
+        called from the download thread once temp_path holds the whole
+        text (ok=True) or the download failed or was cancelled.
+        """
+        cancel = threading.Event()
+        first_part = threading.Event()
+        parts = []
+
+        def part_written(index: int, data: bytes) -> None:
+            on_part(index, data)
+            parts.append(index)
+            first_part.set()
+
+        future = self._submit(stream_factory, temp_path, cancel, part_written)
+        if future is None:
+            return False
+
+        def finished(fut: Future) -> None:
+            ok = fut.exception() is None
+            if cancel.is_set():
+                pass  # Already counted as a timeout.
+            elif ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            first_part.set()
+            on_finished(ok)
+
+        future.add_done_callback(finished)
+        if not first_part.wait(timeout):
+            cancel.set()
+            self.breaker.record_failure()
+            print(f"gTTS timed out after {timeout} seconds.")
+            return False
+        if not parts and future.exception() is not None:
+            raise future.exception()
+        return bool(parts)
+
+    def _submit(
+        self,
+        stream_factory: Callable[[], Iterable[bytes]],
+        temp_path: str,
+        cancel: threading.Event,
+        on_part: Optional[Callable[[int, bytes], None]] = None,
+        background: bool = False,
+    ) -> Optional[Future]:
+        with self._lock:
+            if not self._wait_for_slot(background):
+                print(f"gTTS skipped: {self._outstanding} requests still outstanding.")
+                return None
+            self._outstanding += 1
+
+        if not self.breaker.allow():
+            self._release_slot()
+            print(f"gTTS skipped after repeated failures; retrying in {self.breaker.remaining():.0f} seconds.")
+            return None
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_outstanding, thread_name_prefix="gtts")
+            executor = self._executor
+
+        try:
+            return executor.submit(self._download, stream_factory, temp_path, cancel, on_part)
+        except RuntimeError:
+            # The executor was replaced by configure() in the meantime.
+            self._release_slot()
+            self.breaker.abort_trial()
+            return None
+
+    def wait_for_background_slot(self) -> bool:
+        """Waits until a background download could start; False if none frees up in time."""
+        with self._lock:
+            return self._wait_for_slot(background=True)
+
+    def _wait_for_slot(self, background: bool) -> bool:
+        # Called with the lock held.
+        limit = max(1, self.max_outstanding - 1) if background else self.max_outstanding
+        deadline = time.monotonic() + (self.BACKGROUND_WAIT if background else 0)
+        while self._outstanding >= limit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._slot_freed.wait(remaining)
+        return True
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self._outstanding -= 1
+            self._slot_freed.notify_all()
+
+    def _download(
+        self,
+        stream_factory: Callable[[], Iterable[bytes]],
+        temp_path: str,
+        cancel: threading.Event,
+        on_part: Optional[Callable[[int, bytes], None]] = None,
+    ) -> None:
+        try:
+            with open(temp_path, "wb") as f:
+                for index, chunk in enumerate(stream_factory()):
+                    if cancel.is_set():
+                        raise FetchCancelled()
+                    f.write(chunk)
+                    if on_part is not None:
+                        on_part(index, chunk)
+            if cancel.is_set():
+                raise FetchCancelled()
+        except BaseException:
+            remove_quietly(temp_path)
+            raise
+        finally:
+            self._release_slot()
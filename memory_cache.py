@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+class BoundedCache:
+    """
+    Thread-safe LRU dictionary with an entry cap.
+
+    Entries stored with negative=True (e.g. a dictionary lookup that found
+    no files) expire after negative_ttl seconds so new recordings are
+    picked up without restarting Anki. Values are returned by reference,
+    so callers can keep mutable state (cycle indexes) inside them.
+    """
+
+    def __init__(self, max_entries: int = 10000, negative_ttl: float = 0):
+        self.max_entries = max(1, max_entries)
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._expiry: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries: int, negative_ttl: float) -> None:
+        with self._lock:
+            self.max_entries = max(1, max_entries)
+            self.negative_ttl = negative_ttl
+            self._evict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            expires = self._expiry.get(key)
+            if expires is not None and time.monotonic() >= expires:
+                del self._data[key]
+                del self._expiry[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any, negative: bool = False) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if negative and self.negative_ttl > 0:
+                self._expiry[key] = time.monotonic() + self.negative_ttl
+            else:
+                self._expiry.pop(key, None)
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._data) > self.max_entries:
+            key, _ = self._data.popitem(last=False)
+            self._expiry.pop(key, None)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._expiry.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
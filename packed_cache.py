@@ -0,0 +1,610 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from .persistent_cache import BackgroundMaintenance, is_valid_file, remove_quietly, replace_file
+
+EXT_CODES = {".mp3": 1, ".wav": 2}
+EXT_BY_CODE = {code: ext for ext, code in EXT_CODES.items()}
+
+# Index file: header, then `capacity` fixed-size slots (open addressing, linear probing).
+INDEX_MAGIC = b"TTSIDX01"
+HEADER = struct.Struct("<8sIII12x")       # magic, capacity, used, tombstones
+SLOT = struct.Struct("<20sBBHQII")        # key, state, ext, pack, offset, length, last access
+EMPTY, USED, TOMBSTONE = 0, 1, 2
+LAST_ACCESS_OFFSET = 36
+
+# Pack file: a sequence of records, each a header followed by the clip bytes.
+# A removed clip gets a header-only record, so rebuilding the index from
+# the packs does not bring it back. Records are replayed in (pack, offset)
+# order, which is the order they were written in.
+RECORD_MAGIC = b"TTSR"
+REMOVED_MAGIC = b"TTSD"
+RECORD = struct.Struct("<4s20sBI")        # magic, key, ext, length
+
+Location = Tuple[bytes, int]              # (sha1 key, extension code)
+
+
+class PackedCache(BackgroundMaintenance):
+    """
+    Persistent cache that appends clips to a few large pack files.
+
+    A memory-mapped hash table (pack_index.bin) maps each content key to
+    its pack, offset and length. Clips are written to a local temp folder
+    only when looked up for playback, so the cache folder itself sees a
+    handful of large files instead of one small file per clip. Evicted or
+    replaced clips leave dead space in the packs that compact() reclaims.
+    Paths outside the temp folder pass through unindexed, as with
+    PersistentCache, whose interface this class shares.
+    """
+
+    INDEX_NAME = "pack_index.bin"
+    PACK_DIR = "packs"
+    PACK_MAX_BYTES = 256 * 1024 * 1024
+    INITIAL_CAPACITY = 4096
+    # Played clips kept in the temp folder.
+    MAX_MATERIALIZED = 256
+    # Compact once dead space is this large and at least half of all pack bytes.
+    COMPACT_MIN_BYTES = 8 * 1024 * 1024
+
+    def __init__(self):
+        super().__init__()
+        self.cache_dir: Optional[str] = None
+        self.play_dir: Optional[str] = None
+        self.max_bytes = 0
+        self._index_file: Optional[IO[bytes]] = None
+        self._index: Optional[mmap.mmap] = None
+        self._capacity = 0
+        self._used = 0
+        self._tombstones = 0
+        self._live_bytes = 0
+        self._pack_ids: List[int] = []
+        self._pack_bytes = 0
+        self._active_id = 1
+        self._active_size = 0
+        self._writer: Optional[IO[bytes]] = None
+        self._readers: Dict[int, IO[bytes]] = {}
+        self._materialized: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+
+    # --- Setup ---
+
+    def configure(self, cache_dir: str, max_mb: float) -> None:
+        cache_dir = os.path.normpath(cache_dir)
+        with self._lock:
+            self.max_bytes = int(max_mb * 1024 * 1024) if max_mb and max_mb > 0 else 0
+            if cache_dir == self.cache_dir:
+                return
+            self.close()
+            self.cache_dir = cache_dir
+            digest = hashlib.sha1(cache_dir.encode("utf-8")).hexdigest()[:8]
+            self.play_dir = os.path.join(tempfile.gettempdir(), "anki_tts_packed", digest)
+            os.makedirs(self.play_dir, exist_ok=True)
+            self._load()
+        self._schedule_maintenance()
+
+    def _load(self) -> None:
+        os.makedirs(self._pack_dir(), exist_ok=True)
+        self._pack_ids = sorted(
+            int(name[:-5]) for name in os.listdir(self._pack_dir())
+            if name.endswith(".pack") and name[:-5].isdigit()
+        )
+        self._pack_bytes = sum(os.path.getsize(self._pack_path(pack_id)) for pack_id in self._pack_ids)
+        self._active_id = self._pack_ids[-1] if self._pack_ids else 1
+        if not self._open_index():
+            print(f"Packed cache: rebuilding index from {len(self._pack_ids)} pack files")
+            self.rebuild_index()
+
+    def _pack_dir(self) -> str:
+        return os.path.join(self.cache_dir, self.PACK_DIR)
+
+    def _pack_path(self, pack_id: int) -> str:
+        return os.path.join(self._pack_dir(), f"{pack_id:06d}.pack")
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, self.INDEX_NAME)
+
+    # --- Index file ---
+
+    def _open_index(self) -> bool:
+        """Maps an existing index; False if it is missing or damaged."""
+        path = self._index_path()
+        if not os.path.exists(path):
+            return False
+        f = open(path, "r+b")
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            f.close()
+            return False
+        index = mmap.mmap(f.fileno(), 0)
+        magic, capacity, _, _ = HEADER.unpack_from(index)
+        if magic != INDEX_MAGIC or capacity & (capacity - 1) or size != HEADER.size + capacity * SLOT.size:
+            index.close()
+            f.close()
+            return False
+        self._index_file, self._index, self._capacity = f, index, capacity
+        # The header counters may be stale after a crash; recount.
+        self._used = self._tombstones = self._live_bytes = 0
+        for _, state, _, _, _, length, _ in self._slots():
+            if state == USED:
+                self._used += 1
+                self._live_bytes += RECORD.size + length
+            elif state == TOMBSTONE:
+                self._tombstones += 1
+        self._write_header()
+        return True
+
+    def _close_index(self) -> None:
+        if self._index is not None:
+            self._index.flush()
+            self._index.close()
+            self._index = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+    def _write_index(self, entries: List[Tuple], capacity: int) -> None:
+        """Replaces the index file with a fresh table holding `entries`."""
+        table = bytearray(HEADER.size + capacity * SLOT.size)
+        mask = capacity - 1
+        for key, ext, pack_id, offset, length, last_access in entries:
+            i = int.from_bytes(key[:8], "little") & mask
+            while table[HEADER.size + i * SLOT.size + 20] != EMPTY:
+                i = (i + 1) & mask
+            SLOT.pack_into(table, HEADER.size + i * SLOT.size, key, USED, ext, pack_id, offset, length, last_access)
+        HEADER.pack_into(table, 0, INDEX_MAGIC, capacity, len(entries), 0)
+
+        self._close_index()
+        path = self._index_path()
+        temp_path = f"{path}.new"
+        with open(temp_path, "wb") as f:
+            f.write(table)
+        os.replace(temp_path, path)
+        self._index_file = open(path, "r+b")
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+        self._capacity = capacity
+        self._used = len(entries)
+        self._tombstones = 0
+        self._live_bytes = sum(RECORD.size + entry[4] for entry in entries)
+
+    def _capacity_for(self, count: int) -> int:
+        capacity = self.INITIAL_CAPACITY
+        while capacity < count * 4:
+            capacity *= 2
+        return capacity
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(self._index, 0, INDEX_MAGIC, self._capacity, self._used, self._tombstones)
+
+    def _slots(self) -> Iterator[Tuple]:
+        return SLOT.iter_unpack(self._index[HEADER.size:])
+
+    def _live_entries(self) -> List[Tuple]:
+        return [
+            (key, ext, pack_id, offset, length, last_access)
+            for key, state, ext, pack_id, offset, length, last_access in self._slots()
+            if state == USED
+        ]
+
+    def _probe(self, key: bytes, ext: int) -> Tuple[int, int]:
+        """(slot holding the clip or -1, first reusable slot on its probe path)."""
+        mask = self._capacity - 1
+        i = int.from_bytes(key[:8], "little") & mask
+        free = -1
+        for _ in range(self._capacity):
+            base = HEADER.size + i * SLOT.size
+            state = self._index[base + 20]
+            if state == EMPTY:
+                return -1, free if free >= 0 else i
+            if state == TOMBSTONE:
+                if free < 0:
+                    free = i
+            elif self._index[base:base + 20] == key and self._index[base + 21] == ext:
+                return i, free
+            i = (i + 1) & mask
+        return -1, free
+
+    def _put(self, key: bytes, ext: int, pack_id: int, offset: int, length: int) -> None:
+        if (self._used + self._tombstones + 1) * 2 > self._capacity:
+            self._write_index(self._live_entries(), self._capacity_for(self._used + 1))
+        found, free = self._probe(key, ext)
+        if found >= 0:
+            self._live_bytes -= RECORD.size + SLOT.unpack_from(self._index, HEADER.size + found * SLOT.size)[5]
+            slot = found
+        else:
+            slot = free
+            if self._index[HEADER.size + slot * SLOT.size + 20] == TOMBSTONE:
+                self._tombstones -= 1
+            self._used += 1
+        SLOT.pack_into(self._index, HEADER.size + slot * SLOT.size, key, USED, ext, pack_id, offset, length, int(time.time()))
+        self._live_bytes += RECORD.size + length
+        self._write_header()
+
+    def _drop(self, slot: int) -> None:
+        # Called with the lock held.
+        base = HEADER.size + slot * SLOT.size
+        key, _, ext, _, _, length, _ = SLOT.unpack_from(self._index, base)
+        self._append(key, ext, b"", REMOVED_MAGIC)
+        self._live_bytes -= RECORD.size + length
+        self._index[base + 20] = TOMBSTONE
+        self._used -= 1
+        self._tombstones += 1
+        self._write_header()
+
+    def rebuild_index(self) -> int:
+        """Recreates the index by scanning all pack files. Returns the number of clips found."""
+        with self._lock:
+            found: Dict[Location, Tuple] = {}
+            for pack_id in sorted(self._pack_ids):
+                mtime = int(os.path.getmtime(self._pack_path(pack_id)))
+                for magic, key, ext, offset, length in self._scan_pack(pack_id):
+                    if magic == REMOVED_MAGIC:
+                        found.pop((key, ext), None)
+                    else:
+                        found[(key, ext)] = (key, ext, pack_id, offset, length, mtime)
+            self._pack_bytes = sum(os.path.getsize(self._pack_path(pack_id)) for pack_id in self._pack_ids)
+            self._write_index(list(found.values()), self._capacity_for(len(found)))
+            return len(found)
+
+    def _scan_pack(self, pack_id: int) -> Iterator[Tuple[bytes, bytes, int, int, int]]:
+        """(magic, key, ext, offset, length) of each record; a torn record at the end (interrupted write) is cut off."""
+        path = self._pack_path(pack_id)
+        size = os.path.getsize(path)
+        offset = 0
+        with open(path, "rb") as f:
+            while offset + RECORD.size <= size:
+                f.seek(offset)
+                magic, key, ext, length = RECORD.unpack(f.read(RECORD.size))
+                if magic not in (RECORD_MAGIC, REMOVED_MAGIC) or ext not in EXT_BY_CODE or offset + RECORD.size + length > size:
+                    break
+                yield magic, key, ext, offset, length
+                offset += RECORD.size + length
+        if offset < size:
+            print(f"Packed cache: truncating damaged tail of {path} at {offset} bytes")
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+
+    # --- Pack files ---
+
+    def _append(self, key: bytes, ext: int, data: bytes, magic: bytes = RECORD_MAGIC) -> Tuple[int, int]:
+        # Called with the lock held.
+        if self._writer is not None and self._active_size >= self.PACK_MAX_BYTES:
+            self._roll_pack()
+        if self._writer is None:
+            if os.path.exists(self._pack_path(self._active_id)) and \
+                    os.path.getsize(self._pack_path(self._active_id)) >= self.PACK_MAX_BYTES:
+                self._active_id = max(self._pack_ids + [self._active_id]) + 1
+            self._writer = open(self._pack_path(self._active_id), "ab")
+            self._writer.seek(0, os.SEEK_END)
+            self._active_size = self._writer.tell()
+            if self._active_id not in self._pack_ids:
+                self._pack_ids.append(self._active_id)
+        offset = self._active_size
+        self._writer.write(RECORD.pack(magic, key, ext, len(data)))
+        self._writer.write(data)
+        self._writer.flush()
+        self._active_size += RECORD.size + len(data)
+        self._pack_bytes += RECORD.size + len(data)
+        return self._active_id, offset
+
+    def _roll_pack(self) -> None:
+        """Seals the active pack; the next append starts a new one."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._active_id = max(self._pack_ids + [self._active_id]) + 1
+        self._active_size = 0
+
+    def _read_record(self, f: IO[bytes], key: bytes, offset: int, length: int) -> Optional[bytes]:
+        f.seek(offset)
+        raw = f.read(RECORD.size + length)
+        if len(raw) != RECORD.size + length:
+            return None
+        magic, record_key, _, record_length = RECORD.unpack_from(raw)
+        if magic != RECORD_MAGIC or record_key != key or record_length != length:
+            return None
+        return raw[RECORD.size:]
+
+    # --- Cache interface ---
+
+    def path_for(self, key: str, ext: str) -> str:
+        return os.path.join(self.play_dir, key + ext)
+
+    def _name(self, path: str) -> Optional[Location]:
+        if not self.play_dir:
+            return None
+        path = os.path.normpath(path)
+        if os.path.dirname(path) != self.play_dir:
+            return None
+        stem, ext = os.path.splitext(os.path.basename(path))
+        if ext not in EXT_CODES or len(stem) != 40:
+            return None
+        try:
+            return bytes.fromhex(stem), EXT_CODES[ext]
+        except ValueError:
+            return None
+
+    def add(self, key: str, ext: str, data: bytes) -> bool:
+        """Stores a clip under a content key (hex) and extension such as ".mp3"."""
+        return self._store((bytes.fromhex(key), EXT_CODES[ext]), data)
+
+    def _store(self, name: Location, data: bytes) -> bool:
+        with self._lock:
+            if self._index is None:
+                return False
+            pack_id, offset = self._append(name[0], name[1], data)
+            self._put(name[0], name[1], pack_id, offset, len(data))
+            return True
+
+    def read(self, key: str, ext: str) -> Optional[bytes]:
+        """The clip's bytes, or None if it is not cached."""
+        return self._read(bytes.fromhex(key), EXT_CODES[ext], touch=False)
+
+    def _read(self, key: bytes, ext: int, touch: bool) -> Optional[bytes]:
+        with self._lock:
+            if self._index is None:
+                return None
+            slot, _ = self._probe(key, ext)
+            if slot < 0:
+                return None
+            base = HEADER.size + slot * SLOT.size
+            _, _, _, pack_id, offset, length, _ = SLOT.unpack_from(self._index, base)
+            if touch:
+                struct.pack_into("<I", self._index, base + LAST_ACCESS_OFFSET, int(time.time()))
+            try:
+                f = self._readers.get(pack_id)
+                if f is None:
+                    f = self._readers[pack_id] = open(self._pack_path(pack_id), "rb")
+                data = self._read_record(f, key, offset, length)
+            except OSError as e:
+                print(f"Packed cache: cannot read pack {pack_id}: {e}")
+                data = None
+            if data is None:
+                self._drop(slot)
+            return data
+
+    def lookup(self, path: str) -> bool:
+        """True if the clip for path is cached; writes it to path for the player if needed."""
+        name = self._name(path)
+        if name is None:
+            if is_valid_file(path):
+                return True
+            remove_quietly(path)
+            return False
+
+        basename = os.path.basename(path)
+        with self._lock:
+            materialized = basename in self._materialized
+            if materialized:
+                self._materialized.move_to_end(basename)
+        if materialized and os.path.exists(path):
+            self._touch(name)
+            return True
+
+        data = self._read(*name, touch=True)
+        if data is None:
+            return False
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.temp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Packed cache: could not write '{path}': {e}")
+            remove_quietly(temp_path)
+            return False
+        if not replace_file(temp_path, path):
+            return False
+        self._remember(basename, path)
+        self._schedule_maintenance()
+        return True
+
+    def _touch(self, name: Location) -> None:
+        with self._lock:
+            if self._index is None:
+                return
+            slot, _ = self._probe(*name)
+            if slot >= 0:
+                struct.pack_into("<I", self._index, HEADER.size + slot * SLOT.size + LAST_ACCESS_OFFSET, int(time.time()))
+
+    def _remember(self, basename: str, path: str) -> None:
+        stale = []
+        with self._lock:
+            self._materialized[basename] = path
+            self._materialized.move_to_end(basename)
+            while len(self._materialized) > self.MAX_MATERIALIZED:
+                stale.append(self._materialized.popitem(last=False)[1])
+        for old_path in stale:
+            remove_quietly(old_path)
+
+    def commit(self, temp_path: str, output_path: str, engine: str = "") -> bool:
+        """
+        Appends a finished temp file to the packs and moves it to
+        output_path for playback. Empty or missing temp files are discarded.
+        """
+        if not is_valid_file(temp_path):
+            remove_quietly(temp_path)
+            return False
+        name = self._name(output_path)
+        if name is not None:
+            try:
+                with open(temp_path, "rb") as f:
+                    self._store(name, f.read())
+            except OSError as e:
+                print(f"Packed cache: could not store '{output_path}': {e}")
+        if not replace_file(temp_path, output_path):
+            return False
+        if name is not None:
+            self._remember(os.path.basename(output_path), output_path)
+            self._schedule_maintenance(force=self.max_bytes > 0 and self._live_bytes > self.max_bytes)
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": self._used,
+                "size_mb": round(self._live_bytes / (1024 * 1024), 2),
+                "packs": len(self._pack_ids),
+                "packs_mb": round(self._pack_bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            }
+
+    # --- Maintenance ---
+
+    def _maintenance_job(self) -> None:
+        try:
+            self._evict()
+            dead = self._pack_bytes - self._live_bytes
+            if dead > self.COMPACT_MIN_BYTES and dead * 2 > self._pack_bytes:
+                self.compact()
+            self.flush()
+        except Exception as e:
+            print(f"Packed cache maintenance failed: {e}")
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        stale = []
+        with self._lock:
+            if self._index is None or self._live_bytes <= self.max_bytes:
+                return
+            by_age = sorted(
+                (last_access, slot, key, ext)
+                for slot, (key, state, ext, _, _, _, last_access) in enumerate(self._slots())
+                if state == USED
+            )
+            removed = 0
+            for _, slot, key, ext in by_age:
+                if self._live_bytes <= self.max_bytes:
+                    break
+                self._drop(slot)
+                removed += 1
+                path = self._materialized.pop(key.hex() + EXT_BY_CODE[ext], None)
+                if path:
+                    stale.append(path)
+        for path in stale:
+            remove_quietly(path)
+        print(f"Packed cache: evicted {removed} clips, {self._live_bytes / (1024 * 1024):.1f} MB left")
+
+    def compact(self) -> int:
+        """
+        Copies the live clips of all sealed packs into new packs and deletes
+        the old ones. Playback and commits continue meanwhile; commits go to
+        packs numbered after the copies, so replaying the packs in order
+        still ends with the newest record of each clip. Returns the bytes
+        reclaimed.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if self._index is None:
+                    return 0
+                self._roll_pack()
+                sealed = set(self._pack_ids)
+                live = sorted(
+                    (pack_id, offset, key, ext, length)
+                    for key, ext, pack_id, offset, length, _ in self._live_entries()
+                    if pack_id in sealed
+                )
+                before = self._pack_bytes
+                # The copies get the ids right after the sealed packs and
+                # commits made meanwhile go above them, so a rebuild still
+                # replays every record after the ones it replaced.
+                next_id = self._active_id
+                self._active_id += self._packs_needed(length for _, _, _, _, length in live)
+                self._pack_ids.append(next_id)
+
+            moved = []
+            writer = open(self._pack_path(next_id), "ab")
+            written = 0
+            readers: Dict[int, IO[bytes]] = {}
+            try:
+                for pack_id, offset, key, ext, length in live:
+                    if written >= self.PACK_MAX_BYTES:
+                        writer.close()
+                        next_id += 1
+                        with self._lock:
+                            self._pack_ids.append(next_id)
+                        writer = open(self._pack_path(next_id), "ab")
+                        written = 0
+                    f = readers.get(pack_id)
+                    if f is None:
+                        f = readers[pack_id] = open(self._pack_path(pack_id), "rb")
+                    data = self._read_record(f, key, offset, length)
+                    if data is None:
+                        continue
+                    writer.write(RECORD.pack(RECORD_MAGIC, key, ext, length))
+                    writer.write(data)
+                    moved.append((key, ext, pack_id, offset, next_id, written))
+                    written += RECORD.size + length
+            finally:
+                writer.close()
+                for f in readers.values():
+                    f.close()
+
+            with self._lock:
+                for key, ext, old_pack, old_offset, new_pack, new_offset in moved:
+                    slot, _ = self._probe(key, ext)
+                    if slot < 0:
+                        continue
+                    base = HEADER.size + slot * SLOT.size
+                    _, _, _, pack_id, offset, length, last_access = SLOT.unpack_from(self._index, base)
+                    if (pack_id, offset) == (old_pack, old_offset):
+                        SLOT.pack_into(self._index, base, key, USED, ext, new_pack, new_offset, length, last_access)
+                self._index.flush()
+                for pack_id in sealed:
+                    reader = self._readers.pop(pack_id, None)
+                    if reader:
+                        reader.close()
+                    remove_quietly(self._pack_path(pack_id))
+                self._pack_ids = sorted(pack_id for pack_id in self._pack_ids if pack_id not in sealed)
+                self._pack_bytes = sum(os.path.getsize(self._pack_path(pack_id)) for pack_id in self._pack_ids)
+                reclaimed = before - self._pack_bytes
+        print(f"Packed cache: compacted {len(moved)} clips, reclaimed {reclaimed / (1024 * 1024):.1f} MB")
+        return reclaimed
+
+    def _packs_needed(self, lengths: Iterable[int]) -> int:
+        """How many packs compact() fills with records of these lengths."""
+        packs = 1
+        written = 0
+        for length in lengths:
+            if written >= self.PACK_MAX_BYTES:
+                packs += 1
+                written = 0
+            written += RECORD.size + length
+        return packs
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._index is not None:
+                self._index.flush()
+            if self._writer is not None:
+                self._writer.flush()
+
+    def close(self) -> None:
+        """Flushes and releases all files and deletes the clips written for playback."""
+        with self._lock:
+            self._close_index()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for f in self._readers.values():
+                f.close()
+            self._readers = {}
+            stale = list(self._materialized.values())
+            self._materialized = OrderedDict()
+            play_dir = self.play_dir
+            self.cache_dir = None
+            self.play_dir = None
+        for path in stale:
+            remove_quietly(path)
+        if play_dir:
+            try:
+                os.rmdir(play_dir)
+            except OSError:
+                pass
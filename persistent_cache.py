@@ -0,0 +1,339 @@
+import abc
+import os
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from typing import Dict, List, Optional, Set
+
+from .single_flight import KeyedLocks
+
+ENGINE_BY_EXTENSION = {".mp3": "gTTS", ".wav": "Piper"}
+
+# Names (relative to the cache directory) of files the cache wrote itself:
+# <key[:2]>/<key>.<ext>, or tts-<hash>.<ext> from the old flat layout.
+# Anything else in the folder belongs to the user and is never touched.
+CACHE_NAME = re.compile(r"(?:([0-9a-f]{2})/\1[0-9a-f]{38}|tts-[0-9a-f]+)\.(?:mp3|wav)")
+# What make_temp_path() (or the old layout's ".temp") appends to a cache name.
+TEMP_SUFFIX = re.compile(r"(?:\.[0-9a-f]{8})?\.temp$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT PRIMARY KEY,
+    size INTEGER,
+    last_access REAL,
+    engine TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+def content_key(text: str, lang: str, speed: str, engine: str) -> str:
+    """Hash of everything that changes the generated audio."""
+    raw = "\x1f".join([normalize_text(text), lang, speed, engine])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def is_cache_name(name: str) -> bool:
+    return CACHE_NAME.fullmatch(name) is not None
+
+
+def is_valid_file(path: str) -> bool:
+    try:
+        return os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+
+def remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def make_temp_path(output_path: str) -> str:
+    """A unique temp path next to output_path, so the final rename stays on one volume."""
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    return f"{output_path}.{uuid.uuid4().hex[:8]}.temp"
+
+
+def replace_file(temp_path: str, output_path: str) -> bool:
+    """
+    Moves a finished temp file to output_path. If that fails, the temp
+    file is dropped; returns whether output_path holds a usable file.
+    """
+    try:
+        os.replace(temp_path, output_path)
+        return True
+    except OSError as e:
+        # Typically the target is open in the player; it is complete, so keep it.
+        print(f"Cache: could not replace '{output_path}': {e}")
+        remove_quietly(temp_path)
+        return is_valid_file(output_path)
+
+
+class BackgroundMaintenance(abc.ABC):
+    """
+    Runs a cache's _maintenance_job() on a daemon thread, at most once per
+    FLUSH_INTERVAL seconds unless forced, and never twice at the same time.
+    """
+
+    FLUSH_INTERVAL = 30
+
+    def __init__(self):
+        self._maintenance_thread: Optional[threading.Thread] = None
+        self._last_maintenance = 0.0
+
+    def _schedule_maintenance(self, force: bool = False) -> None:
+        if self._maintenance_thread and self._maintenance_thread.is_alive():
+            return
+        if not force and time.monotonic() - self._last_maintenance < self.FLUSH_INTERVAL:
+            return
+        self._last_maintenance = time.monotonic()
+        self._maintenance_thread = threading.Thread(target=self._maintenance_job, daemon=True)
+        self._maintenance_thread.start()
+
+    @abc.abstractmethod
+    def _maintenance_job(self) -> None:
+        """Flushes and trims the cache; runs on the maintenance thread."""
+
+
+class PersistentCache(BackgroundMaintenance):
+    """
+    Content-addressed audio cache with a size cap.
+
+    Files live at <cache_dir>/<key[:2]>/<key>.<ext>. A small SQLite index
+    (size, last access, engine) is kept in memory and written back from a
+    background thread, which also evicts least recently used files while
+    the cache is larger than max_mb. Paths outside the cache directory
+    (Anki's temp folder), and files in it that the cache did not name
+    (see CACHE_NAME), pass through unindexed and are never evicted.
+    """
+
+    INDEX_NAME = "cache_index.sqlite3"
+    # Temp files younger than this may still be written to.
+    STALE_TEMP_AGE = 3600
+
+    def __init__(self):
+        super().__init__()
+        self.cache_dir: Optional[str] = None
+        self.max_bytes = 0
+        self._entries: Dict[str, List] = {}
+        self._dirty: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._total = 0
+        self._needs_scan = False
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._commit_locks = KeyedLocks()
+
+    def configure(self, cache_dir: str, max_mb: float) -> None:
+        cache_dir = os.path.normpath(cache_dir)
+        with self._lock:
+            self.max_bytes = int(max_mb * 1024 * 1024) if max_mb and max_mb > 0 else 0
+            if cache_dir == self.cache_dir:
+                return
+            self._flush()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.cache_dir = cache_dir
+            self._load()
+        self._schedule_maintenance(force=self._needs_scan)
+
+    def _load(self) -> None:
+        self._entries = {}
+        self._dirty = set()
+        self._removed = set()
+        self._total = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.cache_dir, self.INDEX_NAME), check_same_thread=False)
+        conn.executescript(SCHEMA)
+        self._conn = conn
+        for name, size, last_access, engine in conn.execute("SELECT name, size, last_access, engine FROM entries"):
+            if not is_cache_name(name):
+                # Adopted by an older version that indexed every audio file.
+                self._removed.add(name)
+                continue
+            self._entries[name] = [size, last_access, engine]
+            self._total += size
+        scanned = conn.execute("SELECT value FROM meta WHERE key = 'scanned'").fetchone()
+        self._needs_scan = scanned is None
+
+    def path_for(self, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ext)
+
+    def _name(self, path: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        path = os.path.normpath(path)
+        if os.path.dirname(path) != self.cache_dir and not path.startswith(self.cache_dir + os.sep):
+            return None
+        name = os.path.relpath(path, self.cache_dir).replace(os.sep, "/")
+        return name if is_cache_name(name) else None
+
+    def _record(self, name: str, size: int, engine: str) -> None:
+        with self._lock:
+            old = self._entries.get(name)
+            if old:
+                self._total -= old[0]
+            self._entries[name] = [size, time.time(), engine]
+            self._total += size
+            self._dirty.add(name)
+            self._removed.discard(name)
+
+    def _forget(self, name: str) -> None:
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old:
+                self._total -= old[0]
+            self._dirty.discard(name)
+            self._removed.add(name)
+
+    def lookup(self, path: str) -> bool:
+        """True if a usable cached file exists at path; refreshes its last-access time."""
+        name = self._name(path)
+        if name is None:
+            if is_valid_file(path):
+                return True
+            remove_quietly(path)
+            return False
+
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            # Not indexed (index lost or file copied in): adopt it if usable.
+            if not is_valid_file(path):
+                remove_quietly(path)
+                return False
+            ext = os.path.splitext(path)[1]
+            self._record(name, os.path.getsize(path), ENGINE_BY_EXTENSION.get(ext, ""))
+        elif not os.path.exists(path):
+            self._forget(name)
+            return False
+        else:
+            with self._lock:
+                entry[1] = time.time()
+                self._dirty.add(name)
+        self._schedule_maintenance()
+        return True
+
+    def commit(self, temp_path: str, output_path: str, engine: str = "") -> bool:
+        """
+        Atomically moves a finished temp file to output_path and indexes it.
+        Empty or missing temp files are discarded. Commits to the same path
+        are serialized, so the index always matches the file on disk.
+        """
+        if not is_valid_file(temp_path):
+            remove_quietly(temp_path)
+            return False
+        with self._commit_locks.hold(os.path.normpath(output_path)):
+            if not replace_file(temp_path, output_path):
+                return False
+            name = self._name(output_path)
+            if name is not None:
+                self._record(name, os.path.getsize(output_path), engine)
+        if name is not None:
+            self._schedule_maintenance(force=self.max_bytes > 0 and self._total > self.max_bytes)
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._total / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            }
+
+    def _maintenance_job(self) -> None:
+        try:
+            if self._needs_scan:
+                self._scan()
+            self._evict()
+            with self._lock:
+                self._flush()
+        except Exception as e:
+            print(f"Cache maintenance failed: {e}")
+
+    def _scan(self) -> None:
+        """Indexes cache files already in the cache directory (including the old flat layout)."""
+        cache_dir = self.cache_dir
+        found = 0
+        for dirpath, dirnames, filenames in os.walk(cache_dir):
+            if os.path.normpath(dirpath) == cache_dir:
+                # Only the <key[:2]> folders can hold cache files.
+                dirnames[:] = [d for d in dirnames if re.fullmatch(r"[0-9a-f]{2}", d)]
+            else:
+                dirnames[:] = []
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                temp = TEMP_SUFFIX.search(filename)
+                name = self._name(os.path.join(dirpath, filename[:temp.start()]) if temp else path)
+                if name is None:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if temp:
+                    # Left behind by an interrupted write.
+                    if time.time() - st.st_mtime > self.STALE_TEMP_AGE:
+                        remove_quietly(path)
+                    continue
+                with self._lock:
+                    if name in self._entries:
+                        continue
+                    self._entries[name] = [st.st_size, st.st_mtime, ENGINE_BY_EXTENSION[os.path.splitext(name)[1]]]
+                    self._total += st.st_size
+                    self._dirty.add(name)
+                found += 1
+        with self._lock:
+            if cache_dir == self.cache_dir:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scanned', '1')")
+                self._conn.commit()
+                self._needs_scan = False
+        print(f"Cache: indexed {found} existing files in {cache_dir}")
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return
+            by_age = sorted(self._entries.items(), key=lambda item: item[1][1])
+        removed = 0
+        for name, (size, _, _) in by_age:
+            if self._total <= self.max_bytes:
+                break
+            remove_quietly(os.path.join(self.cache_dir, name))
+            self._forget(name)
+            removed += 1
+        print(f"Cache: evicted {removed} files, {self._total / (1024 * 1024):.1f} MB left")
+
+    def _flush(self) -> None:
+        # Called with the lock held.
+        if self._conn is None or not (self._dirty or self._removed):
+            return
+        rows = [(name, *self._entries[name]) for name in self._dirty if name in self._entries]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO entries (name, size, last_access, engine) VALUES (?, ?, ?, ?)", rows
+        )
+        self._conn.executemany("DELETE FROM entries WHERE name = ?", [(name,) for name in self._removed])
+        self._conn.commit()
+        self._dirty = set()
+        self._removed = set()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
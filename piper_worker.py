@@ -0,0 +1,444 @@
+import os
+import json
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Worker protocol (one JSON object per line, UTF-8):
+#   started as:  <python> <script> --worker --lang <code>
+#   worker:      {"ready": true}                        once the voice model is loaded
+#   add-on:      {"id": 1, "text": "...", "output_file": "..."}
+#   worker:      {"id": 1, "ok": true}  or  {"id": 1, "ok": false, "error": "..."}
+# Lines on stdout that are not JSON objects are ignored, so the script may log freely.
+#
+# Batch mode (one process, one model load, many texts):
+#   started as:  <python> <script> --lang <code> --batch-file <jobs.jsonl>
+#   job file:    one {"id": 0, "text": "...", "output_file": "..."} per line
+#   script:      one {"id": 0, "ok": true} (or "ok": false, "error") per job on stdout, exit code 0
+
+
+class PiperWorker:
+    """A resident Piper process for one language that keeps its voice model loaded."""
+
+    def __init__(self, command: List[str], timeout: float):
+        self.command = command
+        self.timeout = timeout
+        self.process: Optional[subprocess.Popen] = None
+        self._responses: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._stderr: deque = deque(maxlen=20)
+        self._next_id = 0
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> bool:
+        self.close()
+        self._responses = queue.Queue()
+        creation_flags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                bufsize=1,
+                creationflags=creation_flags
+            )
+        except OSError as e:
+            print(f"Piper Worker: failed to start: {e}")
+            self.process = None
+            return False
+
+        threading.Thread(target=self._read_stdout, args=(self.process, self._responses), daemon=True).start()
+        threading.Thread(target=self._read_stderr, args=(self.process,), daemon=True).start()
+
+        ready = self._wait_for(lambda msg: msg.get("ready") is True)
+        if not ready:
+            print(f"Piper Worker: did not become ready. {self.last_error()}")
+            self.close()
+            return False
+        return True
+
+    def _read_stdout(self, process: subprocess.Popen, responses: "queue.Queue[Optional[dict]]") -> None:
+        try:
+            for line in process.stdout:
+                line = line.strip()
+                if not line.startswith("{"):
+                    continue
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(msg, dict):
+                    responses.put(msg)
+        except (OSError, ValueError):
+            pass
+        responses.put(None)
+
+    def _read_stderr(self, process: subprocess.Popen) -> None:
+        try:
+            for line in process.stderr:
+                self._stderr.append(line.rstrip())
+        except (OSError, ValueError):
+            pass
+
+    def _wait_for(self, predicate) -> Optional[dict]:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                msg = self._responses.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if msg is None:
+                # stdout closed: the process exited.
+                return None
+            if predicate(msg):
+                return msg
+
+    def last_error(self) -> str:
+        return "\n".join(self._stderr)
+
+    def synthesize(self, text: str, output_path: str) -> Optional[bool]:
+        """
+        Returns True/False for the worker's answer, or None if the worker
+        crashed or hung (the process is then killed and restarted next time).
+        """
+        if not self.is_alive() and not self.start():
+            return None
+
+        self._next_id += 1
+        request_id = self._next_id
+        request = {"id": request_id, "text": text, "output_file": output_path}
+        try:
+            self.process.stdin.write(json.dumps(request, ensure_ascii=False) + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            print(f"Piper Worker: lost connection: {e}")
+            self.close()
+            return None
+
+        response = self._wait_for(lambda msg: msg.get("id") == request_id)
+        if response is None:
+            print(f"Piper Worker: no response within {self.timeout} seconds. {self.last_error()}")
+            self.close()
+            return None
+        if not response.get("ok"):
+            print(f"Piper Worker Error: {response.get('error', 'unknown error')}")
+            return False
+        return True
+
+    def synthesize_many(
+        self,
+        items: List[Tuple[str, str]],
+        on_result: Optional[Callable[[int, bool], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> List[Optional[bool]]:
+        """
+        Sends all (text, output_path) requests at once and collects the
+        answers, passing each to on_result(index, ok) as it arrives. Items
+        the worker never answered (crash, hang or cancel) are None.
+        """
+        results: List[Optional[bool]] = [None] * len(items)
+        if not items or (not self.is_alive() and not self.start()):
+            return results
+
+        first_id = self._next_id + 1
+        self._next_id += len(items)
+        try:
+            for offset, (text, output_path) in enumerate(items):
+                request = {"id": first_id + offset, "text": text, "output_file": output_path}
+                self.process.stdin.write(json.dumps(request, ensure_ascii=False) + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            print(f"Piper Worker: lost connection: {e}")
+            self.close()
+            return results
+
+        answered = 0
+        while answered < len(items):
+            if cancel is not None and cancel.is_set():
+                # Don't let the worker keep rendering the rest.
+                try:
+                    self.process.kill()
+                except OSError:
+                    pass
+                self.close()
+                break
+            response = self._wait_for(lambda msg: first_id <= msg.get("id", -1) < first_id + len(items))
+            if response is None:
+                print(f"Piper Worker: batch stopped after {answered}/{len(items)} answers. {self.last_error()}")
+                self.close()
+                break
+            index = response["id"] - first_id
+            if results[index] is not None:
+                continue
+            answered += 1
+            results[index] = bool(response.get("ok"))
+            if not response.get("ok"):
+                print(f"Piper Worker Error: {response.get('error', 'unknown error')}")
+            if on_result:
+                on_result(index, results[index])
+        return results
+
+    def close(self) -> None:
+        process = self.process
+        self.process = None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except (OSError, ValueError):
+            pass
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        except OSError:
+            pass
+
+
+class PiperWorkerPool:
+    """
+    Keeps up to pool_size resident workers per (interpreter, script, language).
+
+    A worker command that fails to start is not retried for retry_after
+    seconds; callers get None and use the one-shot subprocess instead.
+    Batches never wait for a busy worker, and single requests don't wait
+    behind workers that are busy with a batch.
+    """
+
+    def __init__(self, pool_size: int = 1, timeout: float = 30, retry_after: float = 300):
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._idle: Dict[tuple, "queue.Queue[PiperWorker]"] = {}
+        self._created: Dict[tuple, int] = {}
+        # Workers per key currently checked out by synthesize_batch().
+        self._batch_busy: Dict[tuple, int] = {}
+        # Checked out when shutdown() ran; closed instead of returned.
+        self._retired: Set[PiperWorker] = set()
+        self._busy: Set[PiperWorker] = set()
+        self._unavailable_until: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_size: int, timeout: float) -> None:
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+
+    def _acquire(self, key: tuple, batch: bool = False) -> Optional[PiperWorker]:
+        with self._lock:
+            if time.monotonic() < self._unavailable_until.get(key, 0):
+                return None
+            idle = self._idle.setdefault(key, queue.Queue())
+            try:
+                worker = idle.get_nowait()
+            except queue.Empty:
+                worker = None
+            if worker is None and self._created.get(key, 0) < self.pool_size:
+                self._created[key] = self._created.get(key, 0) + 1
+                worker = PiperWorker(list(key), self.timeout)
+            if worker is None and (batch or self._created.get(key, 0) <= self._batch_busy.get(key, 0)):
+                # A batch can use the one-shot batch mode instead, and a
+                # single request would wait for a whole batch to finish.
+                return None
+            if worker is not None:
+                if batch:
+                    self._batch_busy[key] = self._batch_busy.get(key, 0) + 1
+                self._busy.add(worker)
+                return worker
+        try:
+            worker = idle.get(timeout=self.timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            self._busy.add(worker)
+        return worker
+
+    def _release(self, key: tuple, worker: PiperWorker, batch: bool = False) -> None:
+        with self._lock:
+            self._busy.discard(worker)
+            retired = worker in self._retired
+            if retired:
+                self._retired.discard(worker)
+            else:
+                if batch:
+                    self._batch_busy[key] -= 1
+                self._idle[key].put(worker)
+        if retired:
+            worker.close()
+
+    def synthesize(self, python_exe: str, script_path: str, lang_code: str, text: str, output_path: str) -> Optional[bool]:
+        """Returns the worker's result, or None when no worker could handle the request."""
+        key = (python_exe, script_path, "--worker", "--lang", lang_code)
+        worker = self._acquire(key)
+        if worker is None:
+            return None
+        worker.timeout = self.timeout
+
+        started = worker.is_alive()
+        try:
+            result = worker.synthesize(text, output_path)
+        finally:
+            self._release(key, worker)
+
+        if result is None and not started and not worker.is_alive():
+            # Could not even start; the script probably has no worker mode.
+            with self._lock:
+                self._unavailable_until[key] = time.monotonic() + self.retry_after
+            print(f"Piper Worker: unavailable for '{lang_code}', using one-shot mode for {self.retry_after:.0f} seconds.")
+        return result
+
+    def synthesize_batch(
+        self,
+        python_exe: str,
+        script_path: str,
+        lang_code: str,
+        items: List[Tuple[str, str]],
+        on_result: Optional[Callable[[int, bool], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[List[Optional[bool]]]:
+        """
+        Like synthesize() for many (text, output_path) items on one worker,
+        see PiperWorker.synthesize_many(); None when no worker is idle.
+        """
+        key = (python_exe, script_path, "--worker", "--lang", lang_code)
+        worker = self._acquire(key, batch=True)
+        if worker is None:
+            return None
+        worker.timeout = self.timeout
+
+        started = worker.is_alive()
+        try:
+            results = worker.synthesize_many(items, on_result, cancel)
+        finally:
+            self._release(key, worker, batch=True)
+
+        cancelled = cancel is not None and cancel.is_set()
+        if not started and not cancelled and not worker.is_alive() and all(r is None for r in results):
+            with self._lock:
+                self._unavailable_until[key] = time.monotonic() + self.retry_after
+            print(f"Piper Worker: unavailable for '{lang_code}', using one-shot mode for {self.retry_after:.0f} seconds.")
+            return None
+        return results
+
+    def shutdown(self) -> None:
+        """Closes all idle workers; workers still in use are closed when they come back."""
+        stale = []
+        with self._lock:
+            for idle in self._idle.values():
+                while not idle.empty():
+                    stale.append(idle.get_nowait())
+            self._retired |= self._busy
+            self._created = {}
+            self._batch_busy = {}
+        for worker in stale:
+            worker.close()
+
+
+class PiperBatchRunner:
+    """
+    Runs many texts through one one-shot Piper process using --batch-file.
+
+    A script that rejects --batch-file (fails without answering any job)
+    is not asked again for retry_after seconds; callers get None and fall
+    back to one process per text.
+    """
+
+    def __init__(self, retry_after: float = 300):
+        self.retry_after = retry_after
+        self._unsupported_until: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def synthesize(
+        self,
+        python_exe: str,
+        script_path: str,
+        lang_code: str,
+        items: List[Tuple[str, str]],
+        on_result: Optional[Callable[[int, bool], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[List[Optional[bool]]]:
+        """
+        Returns per-item success for (text, output_path) items, or None if
+        batch mode is unavailable. Each answer is passed to
+        on_result(index, ok) as the script reports it; items the script
+        did not answer (or that were cancelled) are None.
+        """
+        key = (python_exe, script_path)
+        with self._lock:
+            if time.monotonic() < self._unsupported_until.get(key, 0):
+                return None
+
+        fd, job_path = tempfile.mkstemp(prefix="piper_batch_", suffix=".jsonl")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for index, (text, output_path) in enumerate(items):
+                    f.write(json.dumps({"id": index, "text": text, "output_file": output_path}, ensure_ascii=False) + "\n")
+
+            creation_flags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            try:
+                process = subprocess.Popen(
+                    [python_exe, script_path, "--lang", lang_code, "--batch-file", job_path],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    encoding='utf-8',
+                    creationflags=creation_flags
+                )
+            except OSError as e:
+                print(f"Piper Batch: failed to start: {e}")
+                return None
+
+            stderr: deque = deque(maxlen=20)
+            stderr_reader = threading.Thread(target=lambda: stderr.extend(line.rstrip() for line in process.stderr), daemon=True)
+            stderr_reader.start()
+
+            results: List[Optional[bool]] = [None] * len(items)
+            cancelled = False
+            for line in process.stdout:
+                if cancel is not None and cancel.is_set():
+                    cancelled = True
+                    process.kill()
+                    break
+                line = line.strip()
+                if not line.startswith("{"):
+                    continue
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                index = msg.get("id") if isinstance(msg, dict) else None
+                if not isinstance(index, int) or not 0 <= index < len(items) or results[index] is not None:
+                    continue
+                results[index] = bool(msg.get("ok"))
+                if not msg.get("ok"):
+                    print(f"Piper Batch Error: {msg.get('error', 'unknown error')}")
+                if on_result:
+                    on_result(index, results[index])
+            process.stdout.close()
+            process.wait()
+            stderr_reader.join(timeout=2)
+        finally:
+            try:
+                os.remove(job_path)
+            except OSError:
+                pass
+
+        if not cancelled and all(r is None for r in results):
+            if process.returncode != 0:
+                with self._lock:
+                    self._unsupported_until[key] = time.monotonic() + self.retry_after
+                details = "\n".join(stderr)[-500:]
+                print(f"Piper Batch: --batch-file not supported, using one process per text for {self.retry_after:.0f} seconds. {details}")
+            return None
+        return results
@@ -0,0 +1,74 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Hashable, List, Optional, Set, Tuple
+
+
+class Prefetcher:
+    """
+    Runs background warm-up jobs with a bounded worker pool.
+
+    Each submit() replaces the previous batch: queued jobs from the old
+    batch are dropped, jobs already running finish normally. At most
+    max_in_flight jobs are handed to the pool at once, and a key that is
+    already running is not queued again.
+    """
+
+    def __init__(self, max_workers: int = 2, max_in_flight: int = 4):
+        self.max_workers = max(1, max_workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Deque[Tuple[Hashable, Callable[[], None]]] = deque()
+        self._running: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers: int, max_in_flight: int) -> None:
+        max_workers = max(1, max_workers)
+        with self._lock:
+            self.max_in_flight = max(1, max_in_flight)
+            if max_workers != self.max_workers:
+                if self._executor:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+                self.max_workers = max_workers
+
+    def submit(self, jobs: List[Tuple[Hashable, Callable[[], None]]]) -> None:
+        with self._lock:
+            self._pending.clear()
+            queued = set()
+            for key, job in jobs:
+                if key in queued or key in self._running:
+                    continue
+                queued.add(key)
+                self._pending.append((key, job))
+            self._dispatch()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._pending.clear()
+
+    def _dispatch(self) -> None:
+        # Called with the lock held.
+        while self._pending and len(self._running) < self.max_in_flight:
+            key, job = self._pending.popleft()
+            self._running.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts-prefetch")
+            self._executor.submit(self._run, key, job)
+
+    def _run(self, key: Hashable, job: Callable[[], None]) -> None:
+        try:
+            job()
+        except Exception as e:
+            print(f"Prefetch failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(key)
+                self._dispatch()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            if self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,190 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+@dataclass
+class RenderJob:
+    key: Hashable
+    engine: str
+    is_cached: Callable[[], bool]
+    # True/False, or None if the engine did not try (e.g. gTTS circuit open).
+    render: Callable[[], Optional[bool]]
+    # What a batch renderer needs to render this job with others.
+    item: Any = None
+
+
+@dataclass
+class RenderReport:
+    total: int = 0
+    cached: int = 0
+    rendered: int = 0
+    failed: int = 0
+    skipped: int = 0
+    cancelled: int = 0
+    elapsed: float = 0.0
+    per_engine: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    failures: List[Hashable] = field(default_factory=list)
+
+    def count(self, engine: str, outcome: str) -> None:
+        stats = self.per_engine.setdefault(engine, {"rendered": 0, "failed": 0, "cached": 0})
+        stats[outcome] = stats.get(outcome, 0) + 1
+
+    def summary(self) -> str:
+        rate = self.rendered / self.elapsed if self.elapsed > 0 else 0.0
+        lines = [
+            f"Unique TTS items: {self.total}",
+            f"Already cached: {self.cached}",
+            f"Rendered: {self.rendered} ({rate:.2f}/s over {self.elapsed:.1f}s)",
+            f"Failed: {self.failed}",
+        ]
+        if self.skipped:
+            lines.append(f"Not attempted (engine busy or unavailable, retried on the next run): {self.skipped}")
+        if self.cancelled:
+            lines.append(f"Not started (cancelled): {self.cancelled}")
+        for engine, stats in sorted(self.per_engine.items()):
+            lines.append(f"{engine}: {stats['rendered']} rendered, {stats['failed']} failed, {stats['cached']} cached")
+        for key in self.failures[:10]:
+            lines.append(f"  failed: {key}")
+        if len(self.failures) > 10:
+            lines.append(f"  ... and {len(self.failures) - 10} more")
+        return "\n".join(lines)
+
+
+class RateLimiter:
+    """Spaces out calls to at most `per_second` per second across threads (0 = unlimited)."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def render_jobs(
+    jobs: List[RenderJob],
+    workers: Dict[str, int],
+    rate_limits: Optional[Dict[str, float]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    batch_render: Optional[Dict[str, Callable[..., List[Optional[bool]]]]] = None,
+    batch_size: int = 50,
+) -> RenderReport:
+    """
+    Renders jobs concurrently with one thread pool per engine.
+
+    Jobs whose output is already cached are skipped, so an interrupted run
+    resumes where it stopped. `workers` and `rate_limits` are keyed by
+    engine name; `progress(done, total)` is called from worker threads.
+    Engines in `batch_render` get up to `batch_size` jobs per call as
+    `render(batch, on_result, cancel)`; it reports each job through
+    on_result(index, ok) when done and returns None for jobs it skipped on
+    cancel. Each call counts once against the engine's rate limit.
+    """
+    report = RenderReport(total=len(jobs))
+    rate_limits = rate_limits or {}
+    batch_render = batch_render or {}
+    cancel = cancel or threading.Event()
+    start = time.monotonic()
+    done = 0
+    lock = threading.Lock()
+
+    pending: Dict[str, List[RenderJob]] = {}
+    for job in jobs:
+        if job.is_cached():
+            report.cached += 1
+            report.count(job.engine, "cached")
+        else:
+            pending.setdefault(job.engine, []).append(job)
+    done = report.cached
+    if progress:
+        progress(done, report.total)
+
+    limiters = {engine: RateLimiter(rate_limits.get(engine, 0)) for engine in pending}
+
+    def record(job: RenderJob, ok: Optional[bool]) -> None:
+        nonlocal done
+        with lock:
+            if ok:
+                report.rendered += 1
+                report.count(job.engine, "rendered")
+            elif ok is None:
+                report.skipped += 1
+            else:
+                report.failed += 1
+                report.count(job.engine, "failed")
+                report.failures.append(job.key)
+            done += 1
+            current = done
+        if progress:
+            progress(current, report.total)
+
+    def run(job: RenderJob) -> None:
+        if cancel.is_set():
+            with lock:
+                report.cancelled += 1
+            return
+        limiters[job.engine].wait()
+        try:
+            ok = job.render()
+        except Exception as e:
+            print(f"Pre-render failed for {job.key}: {e}")
+            ok = False
+        record(job, ok)
+
+    def run_batch(batch: List[RenderJob]) -> None:
+        if cancel.is_set():
+            with lock:
+                report.cancelled += len(batch)
+            return
+        engine = batch[0].engine
+        limiters[engine].wait()
+        recorded = [False] * len(batch)
+
+        def on_result(index: int, ok: bool) -> None:
+            recorded[index] = True
+            record(batch[index], ok)
+
+        try:
+            outcomes = batch_render[engine](batch, on_result, cancel)
+        except Exception as e:
+            print(f"Pre-render batch of {len(batch)} {engine} jobs failed: {e}")
+            outcomes = [False] * len(batch)
+        for index, (job, ok) in enumerate(zip(batch, outcomes)):
+            if recorded[index]:
+                continue
+            if ok is None:
+                with lock:
+                    report.cancelled += 1
+            else:
+                record(job, ok)
+
+    executors: List[Tuple[ThreadPoolExecutor, List[RenderJob]]] = []
+    for engine, engine_jobs in pending.items():
+        executor = ThreadPoolExecutor(max_workers=max(1, workers.get(engine, 1)), thread_name_prefix=f"prerender-{engine}")
+        executors.append((executor, engine_jobs))
+    for executor, engine_jobs in executors:
+        engine = engine_jobs[0].engine
+        if engine in batch_render:
+            size = max(1, batch_size)
+            for start_index in range(0, len(engine_jobs), size):
+                executor.submit(run_batch, engine_jobs[start_index:start_index + size])
+            continue
+        for job in engine_jobs:
+            executor.submit(run, job)
+    for executor, _ in executors:
+        executor.shutdown(wait=True)
+
+    report.elapsed = time.monotonic() - start
+    return report
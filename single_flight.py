@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Tuple
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one.
+
+    The first caller for a key (the leader) does the work; callers that
+    arrive while it is running wait for the leader's Future and get the
+    same result or exception. Once the leader finishes, the key is free
+    again, so results are never cached here.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._coalesced = 0
+        self._lock = threading.Lock()
+
+    def begin(self, key: Hashable) -> Tuple[Future, bool]:
+        """Returns the key's pending Future and whether the caller leads (must call finish())."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def finish(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None) -> None:
+        """Publishes the leader's outcome. Later calls for the same Future are ignored."""
+        with self._lock:
+            if future.done():
+                return
+            if self._calls.get(key) is future:
+                del self._calls[key]
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def run(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        future, leader = self.begin(key)
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._calls), "coalesced": self._coalesced}
+
+
+class KeyedLocks:
+    """One lock per key, dropped again once no thread holds or waits for it."""
+
+    def __init__(self):
+        self._locks: Dict[Hashable, List] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: Hashable) -> Iterator[None]:
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
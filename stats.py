@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator
+
+# Log-spaced latency buckets from 0.1 ms to ~2 min (ratio 1.25 per bucket).
+BUCKET_BASE = 0.0001
+BUCKET_RATIO = 1.25
+BUCKET_COUNT = 64
+
+
+class Histogram:
+    """Constant-memory latency histogram; percentiles are bucket upper bounds."""
+
+    def __init__(self):
+        self.buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        if seconds <= BUCKET_BASE:
+            index = 0
+        else:
+            index = min(BUCKET_COUNT - 1, int(math.log(seconds / BUCKET_BASE, BUCKET_RATIO)) + 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(self.max, BUCKET_BASE * BUCKET_RATIO ** index)
+        return self.max
+
+
+class LatencyStats:
+    """
+    Per-stage timings and per-source outcome counters for the playback pipeline.
+    While disabled, timed() wrappers only check a flag. Work done inside
+    scope(label) (prefetch, pre-render) is recorded as "<name> (<label>)",
+    so it does not mix with what the user heard.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.time()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def scope(self, label: str) -> Iterator[None]:
+        previous = getattr(self._local, "label", None)
+        self._local.label = label
+        try:
+            yield
+        finally:
+            self._local.label = previous
+
+    def _scoped(self, name: str) -> str:
+        label = getattr(self._local, "label", None)
+        return f"{name} ({label})" if label else name
+
+    def record(self, stage: str, seconds: float) -> None:
+        stage = self._scoped(stage)
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.add(seconds)
+
+    def count(self, source: str, outcome: str) -> None:
+        if not self.enabled:
+            return
+        source = self._scoped(source)
+        with self._lock:
+            counters = self._counters.setdefault(source, {})
+            counters[outcome] = counters.get(outcome, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self.started = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": h.count,
+                    "mean_ms": round(h.total / h.count * 1000, 2) if h.count else 0.0,
+                    "p50_ms": round(h.percentile(50) * 1000, 2),
+                    "p95_ms": round(h.percentile(95) * 1000, 2),
+                    "p99_ms": round(h.percentile(99) * 1000, 2),
+                    "max_ms": round(h.max * 1000, 2),
+                }
+                for stage, h in sorted(self._histograms.items())
+            }
+            sources = {}
+            for source, counters in sorted(self._counters.items()):
+                total = sum(counters.values())
+                sources[source] = dict(counters, total=total)
+                if "hit" in counters:
+                    sources[source]["hit_rate"] = round(counters["hit"] / total, 3)
+        return {"since": self.started, "stages": stages, "sources": sources}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_csv(self) -> str:
+        snapshot = self.snapshot()
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["stage", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+        for stage, row in snapshot["stages"].items():
+            writer.writerow([stage, row["count"], row["mean_ms"], row["p50_ms"], row["p95_ms"], row["p99_ms"], row["max_ms"]])
+        writer.writerow([])
+        writer.writerow(["source", "outcome", "count"])
+        for source, counters in snapshot["sources"].items():
+            for outcome, value in counters.items():
+                writer.writerow([source, outcome, value])
+        return out.getvalue()
+
+    def to_text(self) -> str:
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<36}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)"]
+        for stage, row in snapshot["stages"].items():
+            lines.append(
+                f"{stage:<36}{row['count']:>8}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}"
+                f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}"
+            )
+        lines.append("")
+        for source, counters in snapshot["sources"].items():
+            parts = ", ".join(f"{k}: {v}" for k, v in counters.items())
+            lines.append(f"{source:<36}{parts}")
+        return "\n".join(lines)
+
+
+STATS = LatencyStats()
+
+
+def timed(stage: str) -> Callable:
+    """Decorator recording the wall time of each call under `stage` while STATS is enabled."""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not STATS.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STATS.record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def outside_playback(label: str) -> Callable:
+    """Decorator recording a call's stages and counters under STATS.scope(label)."""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with STATS.scope(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,114 @@
+import threading
+import uuid
+from typing import Any, Callable, List, Optional
+
+
+class SegmentPlayback:
+    """
+    Plays a gTTS text part by part while the rest is still downloading.
+
+    Each audio part Google returns is a complete MP3 and is written to its
+    own segment file. The caller plays the first segment; once attach()
+    has been called, later segments are queued in Anki's player right
+    behind the previous one as they arrive. If the player has no
+    accessible queue, the remaining segments are played as one file when
+    the download finishes. Once anything else starts playing, the
+    remaining segments are dropped.
+
+    add_part() and finish() may be called from any thread; player
+    interaction happens through run_on_main.
+    """
+
+    def __init__(self, base_path: str, player: Any, make_tag: Callable[[str], Any], run_on_main: Callable[[Callable[[], None]], None]):
+        self.base_path = f"{base_path}.{uuid.uuid4().hex[:8]}"
+        self.segments: List[str] = []
+        self.finished = False
+        self.stopped = False
+        self._player = player
+        self._make_tag = make_tag
+        self._run_on_main = run_on_main
+        self._attached = False
+        self._queued = 0
+        self._last_tag: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    @property
+    def first(self) -> Optional[str]:
+        with self._lock:
+            return self.segments[0] if self.segments else None
+
+    def add_part(self, index: int, data: bytes) -> None:
+        path = f"{self.base_path}.part{index}.mp3"
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            self.segments.append(path)
+            attached = self._attached
+        if attached:
+            self._run_on_main(self._queue_ready)
+
+    def finish(self, ok: bool) -> None:
+        with self._lock:
+            self.finished = True
+        if not ok:
+            print(f"gTTS streaming: download stopped after {len(self.segments)} part(s).")
+        self._run_on_main(self._queue_ready)
+
+    def attach(self) -> None:
+        """Call on the main thread right after the first segment was handed to the player."""
+        with self._lock:
+            self._attached = True
+            self._queued = 1
+        enqueued = getattr(self._player, "_enqueued", None)
+        if enqueued and getattr(enqueued[0], "filename", None) == self.segments[0]:
+            self._last_tag = enqueued[0]
+        self._queue_ready()
+
+    def owns(self, tag: Any) -> bool:
+        with self._lock:
+            return getattr(tag, "filename", None) in self.segments
+
+    def stop(self) -> None:
+        self.stopped = True
+
+    def _queue_ready(self) -> None:
+        # Main thread only.
+        with self._lock:
+            if not self._attached or self.stopped:
+                return
+            ready = self.segments[self._queued:]
+            finished = self.finished
+        if not ready:
+            return
+
+        enqueued = getattr(self._player, "_enqueued", None)
+        if not isinstance(enqueued, list):
+            # No queue to insert into: play the rest in one go at the end.
+            if finished:
+                with self._lock:
+                    self._queued += len(ready)
+                self._player.insert_file(self._concatenate(ready))
+            return
+
+        for path in ready:
+            tag = self._make_tag(path)
+            position = 0
+            for i, queued in enumerate(enqueued):
+                if queued is self._last_tag:
+                    position = i + 1
+                    break
+            enqueued.insert(position, tag)
+            self._last_tag = tag
+        with self._lock:
+            self._queued += len(ready)
+        play_next = getattr(self._player, "_play_next_if_idle", None)
+        if play_next:
+            play_next()
+
+    def _concatenate(self, paths: List[str]) -> str:
+        out_path = f"{self.base_path}.rest.mp3"
+        with open(out_path, "wb") as out:
+            for path in paths:
+                with open(path, "rb") as f:
+                    out.write(f.read())
+        return out_path
@@ -0,0 +1,10 @@
+import os
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import the add-on's modules without running its Anki-dependent __init__.
+package = types.ModuleType("tts_addon")
+package.__path__ = [ADDON_DIR]
+sys.modules.setdefault("tts_addon", package)
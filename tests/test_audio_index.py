@@ -0,0 +1,82 @@
+import os
+
+from tts_addon.audio_index import AudioDictionaryIndex
+
+
+def write(path, data=b"ID3"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def make_index(tmp_path):
+    root = str(tmp_path / "dict")
+    os.makedirs(root)
+    index = AudioDictionaryIndex(str(tmp_path / "index.sqlite3"))
+    index.configure(root, [])
+    return root, index
+
+
+def test_lookup_waits_for_first_build(tmp_path):
+    root, index = make_index(tmp_path)
+    write(os.path.join(root, "de", "anna", "haus.mp3"))
+    assert index.lookup("de", "haus") is None
+    index.refresh()
+    assert index.lookup("de", "haus") == [os.path.join(root, "de", "anna", "haus.mp3")]
+
+
+def test_incremental_refresh(tmp_path):
+    root, index = make_index(tmp_path)
+    haus = write(os.path.join(root, "de", "anna", "haus.mp3"))
+    write(os.path.join(root, "de", "bernd", "baum.mp3"))
+    assert index.refresh() == 4
+    assert index.refresh() == 0
+
+    # A new recording rescans only its speaker folder.
+    haus2 = write(os.path.join(root, "de", "bernd", "haus.mp3"))
+    assert index.refresh() == 1
+    assert index.lookup("de", "haus") == [haus, haus2]
+
+    # A removed speaker folder drops its recordings.
+    os.remove(haus2)
+    os.remove(os.path.join(root, "de", "bernd", "baum.mp3"))
+    os.rmdir(os.path.join(root, "de", "bernd"))
+    index.refresh()
+    assert index.lookup("de", "haus") == [haus]
+    assert index.lookup("de", "baum") == []
+
+
+def test_empty_file_is_found_once_filled(tmp_path):
+    root, index = make_index(tmp_path)
+    path = write(os.path.join(root, "de", "anna", "haus.mp3"), b"")
+    index.refresh()
+    assert index.lookup("de", "haus") == []
+
+    # Writing into the file leaves the directory's mtime alone.
+    dir_mtime = os.stat(os.path.dirname(path)).st_mtime
+    write(path)
+    assert os.stat(os.path.dirname(path)).st_mtime == dir_mtime
+    assert index.refresh() == 1
+    assert index.lookup("de", "haus") == [path]
+    assert index.refresh() == 0
+
+
+def test_case_matches_glob(tmp_path):
+    root, index = make_index(tmp_path)
+    path = write(os.path.join(root, "de", "anna", "Hallo.mp3"))
+    index.refresh()
+    case_insensitive = os.path.normcase("A") == "a"
+    assert index.lookup("de", "hallo") == ([path] if case_insensitive else [])
+    assert index.lookup("DE", "Hallo") == ([path] if case_insensitive else [])
+    assert index.lookup("de", "Hallo") == [path]
+
+
+def test_exclusions(tmp_path):
+    root = str(tmp_path / "dict")
+    kept = write(os.path.join(root, "de", "anna", "haus.mp3"))
+    write(os.path.join(root, "de", "noisy", "haus.mp3"))
+    index = AudioDictionaryIndex(str(tmp_path / "index.sqlite3"))
+    index.configure(root, ["noisy"])
+    index.refresh()
+    assert index.lookup("de", "haus") == [kept]
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from tts_addon.gtts_fetch import GTTSFetcher
+
+
+def blocking_stream(release):
+    def stream():
+        release.wait(5)
+        yield b"ID3"
+    return stream
+
+
+def quick_stream():
+    yield b"ID3"
+
+
+def test_background_waits_and_leaves_a_slot_for_playback(tmp_path):
+    fetcher = GTTSFetcher(max_outstanding=2)
+    release = threading.Event()
+    results = {}
+
+    busy = threading.Thread(target=lambda: results.setdefault("busy", fetcher.fetch(blocking_stream(release), str(tmp_path / "a"), 5)))
+    busy.start()
+    time.sleep(0.1)
+    background = threading.Thread(target=lambda: results.setdefault("background", fetcher.fetch(quick_stream, str(tmp_path / "b"), 5, background=True)))
+    background.start()
+    time.sleep(0.1)
+    assert "background" not in results
+
+    # The slot background downloads leave free is still there for playback.
+    assert fetcher.fetch(quick_stream, str(tmp_path / "c"), 5) is True
+
+    release.set()
+    busy.join()
+    background.join()
+    assert results == {"busy": True, "background": True}
+
+
+def test_not_attempted_is_none(tmp_path):
+    fetcher = GTTSFetcher(max_outstanding=1)
+    fetcher.BACKGROUND_WAIT = 0.1
+    release = threading.Event()
+    busy = threading.Thread(target=fetcher.fetch, args=(blocking_stream(release), str(tmp_path / "a"), 5))
+    busy.start()
+    time.sleep(0.1)
+    assert fetcher.fetch(quick_stream, str(tmp_path / "b"), 5) is None
+    assert fetcher.fetch(quick_stream, str(tmp_path / "c"), 5, background=True) is None
+    release.set()
+    busy.join()
+
+    fetcher.breaker.failures = fetcher.breaker.threshold
+    fetcher.breaker._open_until = time.monotonic() + 60
+    assert fetcher.fetch(quick_stream, str(tmp_path / "d"), 5) is None
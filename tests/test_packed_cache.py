@@ -0,0 +1,133 @@
+import os
+import threading
+
+import pytest
+
+from tts_addon.packed_cache import PackedCache
+
+
+def key(i, prefix=""):
+    return prefix + "%0*x" % (40 - len(prefix), i)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    store = PackedCache()
+    store.INITIAL_CAPACITY = 16
+    store.configure(str(tmp_path / "cache"), 0)
+    yield store
+    store.close()
+
+
+def reopen(store, cache_dir):
+    store.close()
+    store.configure(cache_dir, 0)
+
+
+def test_put_overwrite_and_read(cache):
+    assert cache.read(key(1), ".mp3") is None
+    cache.add(key(1), ".mp3", b"first")
+    cache.add(key(1), ".wav", b"other extension")
+    cache.add(key(1), ".mp3", b"second")
+    assert cache.read(key(1), ".mp3") == b"second"
+    assert cache.read(key(1), ".wav") == b"other extension"
+    assert cache.stats()["entries"] == 2
+
+
+def test_probe_through_tombstones(cache):
+    # Same first 8 bytes: all keys land in one probe chain.
+    colliding = [key(i, prefix="00" * 8) for i in range(4)]
+    for i, k in enumerate(colliding[:3]):
+        cache.add(k, ".mp3", b"clip %d" % i)
+    with cache._lock:
+        slot, _ = cache._probe(bytes.fromhex(colliding[0]), 1)
+        cache._drop(slot)
+    assert cache.read(colliding[0], ".mp3") is None
+    assert cache.read(colliding[1], ".mp3") == b"clip 1"
+    assert cache.read(colliding[2], ".mp3") == b"clip 2"
+    assert cache._tombstones == 1
+
+    # A new key on the same chain reuses the tombstone.
+    cache.add(colliding[3], ".mp3", b"clip 3")
+    assert cache._tombstones == 0
+    assert cache.read(colliding[3], ".mp3") == b"clip 3"
+    assert cache.stats()["entries"] == 3
+
+
+def test_index_grows(cache, tmp_path):
+    for i in range(200):
+        cache.add(key(i), ".mp3", b"clip %d" % i)
+    assert cache._capacity >= 4 * 200
+    assert all(cache.read(key(i), ".mp3") == b"clip %d" % i for i in range(200))
+    reopen(cache, str(tmp_path / "cache"))
+    assert cache.stats()["entries"] == 200
+    assert cache.read(key(123), ".mp3") == b"clip 123"
+
+
+@pytest.mark.parametrize("damage", ["missing", "empty", "garbage"])
+def test_rebuild_after_missing_or_damaged_index(cache, tmp_path, damage):
+    cache_dir = str(tmp_path / "cache")
+    for i in range(50):
+        cache.add(key(i), ".mp3", b"old")
+        cache.add(key(i), ".mp3", b"clip %d" % i)
+    cache.close()
+    index_path = os.path.join(cache_dir, PackedCache.INDEX_NAME)
+    if damage == "missing":
+        os.remove(index_path)
+    else:
+        with open(index_path, "r+b") as f:
+            if damage == "empty":
+                f.truncate(0)
+            else:
+                f.write(b"not an index")
+    cache.configure(cache_dir, 0)
+    assert cache.stats()["entries"] == 50
+    assert all(cache.read(key(i), ".mp3") == b"clip %d" % i for i in range(50))
+
+
+def test_rebuild_keeps_evicted_clips_out(cache, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    for i in range(20):
+        cache.add(key(i), ".mp3", b"x" * 1000)
+    cache.max_bytes = 10 * 1000
+    cache._evict()
+    kept = {i for i in range(20) if cache.read(key(i), ".mp3") is not None}
+    assert 0 < len(kept) < 20
+
+    cache.close()
+    os.remove(os.path.join(cache_dir, PackedCache.INDEX_NAME))
+    cache.configure(cache_dir, 0)
+    assert {i for i in range(20) if cache.read(key(i), ".mp3") is not None} == kept
+
+
+def test_compaction_while_commits_continue(cache, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache.COMPACT_MIN_BYTES = 0
+    cache.PACK_MAX_BYTES = 4096
+    for i in range(100):
+        cache.add(key(i), ".mp3", b"stale" * 20)
+        cache.add(key(i), ".mp3", b"clip %d" % i)
+
+    expected = {i: b"clip %d" % i for i in range(100)}
+    reclaimed = []
+    compaction = threading.Thread(target=lambda: reclaimed.append(cache.compact()))
+    compaction.start()
+    for i in range(50, 150):
+        # Overwrites and new clips land while the packs are being copied.
+        cache.add(key(i), ".mp3", b"new %d" % i)
+        expected[i] = b"new %d" % i
+    for i in range(0, 10):
+        with cache._lock:
+            slot, _ = cache._probe(bytes.fromhex(key(i)), 1)
+            cache._drop(slot)
+        del expected[i]
+    compaction.join()
+
+    assert reclaimed[0] > 0
+    assert {i: cache.read(key(i), ".mp3") for i in range(150) if cache.read(key(i), ".mp3") is not None} == expected
+
+    # Replaying the packs gives the same result as the live index.
+    cache.close()
+    os.remove(os.path.join(cache_dir, PackedCache.INDEX_NAME))
+    cache.configure(cache_dir, 0)
+    assert {i: cache.read(key(i), ".mp3") for i in range(150) if cache.read(key(i), ".mp3") is not None} == expected
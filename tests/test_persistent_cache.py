@@ -0,0 +1,39 @@
+import os
+
+from tts_addon.persistent_cache import PersistentCache, content_key, make_temp_path
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\x00" * size)
+
+
+def test_user_files_are_never_adopted_or_evicted(tmp_path):
+    """A cache pointed at a shared folder only manages the files it named"""
+    user_files = [str(tmp_path / f"user_recording_{i}.mp3") for i in range(5)]
+    user_files += [str(tmp_path / "Hallo.wav"), str(tmp_path / "sub" / "deep.mp3"), str(tmp_path / "ab" / "notes.mp3")]
+    for path in user_files:
+        write(path, 400 * 1024)
+    legacy = str(tmp_path / "tts-0123456789ab.mp3")
+    write(legacy, 400 * 1024)
+
+    cache = PersistentCache()
+    cache.configure(str(tmp_path), 1)
+    cache._maintenance_thread.join()
+    for path in user_files:
+        assert cache.lookup(path)
+
+    keyed = []
+    for i in range(4):
+        path = cache.path_for(content_key(f"text {i}", "de", "normal", "gTTS"), ".mp3")
+        temp_path = make_temp_path(path)
+        write(temp_path, 400 * 1024)
+        assert cache.commit(temp_path, path, "gTTS")
+        keyed.append(path)
+    cache._maintenance_job()
+
+    assert all(os.path.exists(path) for path in user_files)
+    assert sum(os.path.exists(path) for path in keyed + [legacy]) == 2
+    assert not os.path.exists(legacy)
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+import time
+
+from tts_addon.piper_worker import PiperWorker, PiperWorkerPool
+
+FAKE_PIPER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "fake_piper.py")
+
+
+def worker_command(script=FAKE_PIPER):
+    return [sys.executable, script, "--worker", "--lang", "de"]
+
+
+def test_ready_and_request_response(tmp_path):
+    worker = PiperWorker(worker_command(), timeout=10)
+    try:
+        assert worker.start()
+        assert worker.is_alive()
+        out = str(tmp_path / "hallo.wav")
+        assert worker.synthesize("Hallo", out) is True
+        assert os.path.getsize(out) > 0
+        assert worker.synthesize("Hallo FAIL", str(tmp_path / "fail.wav")) is False
+        # A failed text does not cost the worker.
+        assert worker.is_alive()
+    finally:
+        worker.close()
+
+
+def test_restart_after_crash(tmp_path):
+    worker = PiperWorker(worker_command(), timeout=10)
+    try:
+        assert worker.synthesize("eins", str(tmp_path / "1.wav")) is True
+        first = worker.process.pid
+        assert worker.synthesize("CRASH", str(tmp_path / "2.wav")) is None
+        assert not worker.is_alive()
+        assert worker.synthesize("drei", str(tmp_path / "3.wav")) is True
+        assert worker.process.pid != first
+    finally:
+        worker.close()
+
+
+def test_timeout_kills_the_worker(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_PIPER_DELAY", "5")
+    worker = PiperWorker(worker_command(), timeout=1)
+    try:
+        start = time.monotonic()
+        assert worker.synthesize("langsam", str(tmp_path / "slow.wav")) is None
+        assert time.monotonic() - start < 4
+        assert worker.process is None
+    finally:
+        worker.close()
+
+
+def test_pool_marks_scripts_without_worker_mode_unavailable(tmp_path):
+    script = tmp_path / "old_piper.py"
+    script.write_text("import sys\nsys.exit('unrecognized arguments: --worker')\n")
+    pool = PiperWorkerPool(pool_size=1, timeout=10, retry_after=300)
+    try:
+        assert pool.synthesize(sys.executable, str(script), "de", "Hallo", str(tmp_path / "a.wav")) is None
+        # Later requests go straight to the one-shot path without starting anything.
+        start = time.monotonic()
+        assert pool.synthesize(sys.executable, str(script), "de", "Hallo", str(tmp_path / "b.wav")) is None
+        assert pool.synthesize_batch(sys.executable, str(script), "de", [("Hallo", str(tmp_path / "c.wav"))]) is None
+        assert time.monotonic() - start < 0.5
+    finally:
+        pool.shutdown()
+
+
+def test_pool_reuses_its_worker(tmp_path):
+    pool = PiperWorkerPool(pool_size=1, timeout=10)
+    try:
+        for i in range(3):
+            assert pool.synthesize(sys.executable, FAKE_PIPER, "de", f"Satz {i}", str(tmp_path / f"{i}.wav")) is True
+        (idle,) = pool._idle.values()
+        assert idle.qsize() == 1
+    finally:
+        pool.shutdown()
+
+
+def test_single_request_does_not_wait_behind_a_batch(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_PIPER_DELAY", "0.2")
+    pool = PiperWorkerPool(pool_size=1, timeout=10)
+    items = [(f"Satz {i}", str(tmp_path / f"{i}.wav")) for i in range(10)]
+    results = []
+    batch = threading.Thread(target=lambda: results.append(pool.synthesize_batch(sys.executable, FAKE_PIPER, "de", items)))
+    try:
+        batch.start()
+        time.sleep(0.5)
+        start = time.monotonic()
+        assert pool.synthesize(sys.executable, FAKE_PIPER, "de", "jetzt", str(tmp_path / "now.wav")) is None
+        assert time.monotonic() - start < 0.5
+        batch.join()
+        assert results == [[True] * len(items)]
+    finally:
+        batch.join()
+        pool.shutdown()
+
+
+def test_shutdown_closes_workers_that_are_still_in_use(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_PIPER_DELAY", "0.5")
+    pool = PiperWorkerPool(pool_size=1, timeout=10)
+    results = []
+    busy = threading.Thread(target=lambda: results.append(pool.synthesize(sys.executable, FAKE_PIPER, "de", "Hallo", str(tmp_path / "a.wav"))))
+    busy.start()
+    time.sleep(0.3)
+    (worker,) = pool._busy
+    pool.shutdown()
+    busy.join()
+
+    assert results == [True]
+    assert worker.process is None
+    (idle,) = pool._idle.values()
+    assert idle.empty()
+    # The pool starts fresh workers afterwards.
+    assert pool.synthesize(sys.executable, FAKE_PIPER, "de", "wieder", str(tmp_path / "b.wav")) is True
+    pool.shutdown()
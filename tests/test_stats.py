@@ -0,0 +1,35 @@
+import threading
+
+from tts_addon.stats import STATS, outside_playback, timed
+
+
+def test_background_work_is_recorded_apart_from_playback():
+    """Prefetch and pre-render don't count towards playback stages and hit rates"""
+    STATS.enabled = True
+    STATS.reset()
+    try:
+        @timed("try_gtts")
+        def play():
+            STATS.count("gTTS", "hit")
+
+        @outside_playback("prefetch")
+        def prefetch():
+            play()
+            STATS.count("gTTS", "generated")
+
+        prefetch()
+        play()
+        other = threading.Thread(target=play)
+        with STATS.scope("prefetch"):
+            # The scope belongs to this thread only.
+            other.start()
+            other.join()
+
+        snapshot = STATS.snapshot()
+        assert snapshot["stages"]["try_gtts"]["count"] == 2
+        assert snapshot["stages"]["try_gtts (prefetch)"]["count"] == 1
+        assert snapshot["sources"]["gTTS"] == {"hit": 2, "total": 2, "hit_rate": 1.0}
+        assert snapshot["sources"]["gTTS (prefetch)"]["generated"] == 1
+    finally:
+        STATS.enabled = False
+        STATS.reset()
@@ -0,0 +1,236 @@
+"""
+Minimal stand-ins for the parts of `anki` and `aqt` the add-on touches,
+so it can be imported and driven outside Anki by the benchmarks in this
+folder. Nothing here draws a window; menu actions and dialogs are inert.
+
+    from anki_stubs import install, load_addon
+    install(config={"audio_dictionary_enabled": False})
+    addon = load_addon()
+"""
+
+import copy
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import types
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A subset of anki.lang.compatMap.
+COMPAT_MAP = {
+    "af": "af_ZA", "ar": "ar_SA", "cs": "cs_CZ", "da": "da_DK", "de": "de_DE",
+    "el": "el_GR", "en": "en_US", "es": "es_ES", "fi": "fi_FI", "fr": "fr_FR",
+    "he": "he_IL", "hu": "hu_HU", "it": "it_IT", "ja": "ja_JP", "ko": "ko_KR",
+    "nl": "nl_NL", "no": "nb_NO", "pl": "pl_PL", "pt": "pt_PT", "ro": "ro_RO",
+    "ru": "ru_RU", "sk": "sk_SK", "sv": "sv_SE", "th": "th_TH", "tr": "tr_TR",
+    "uk": "uk_UA", "vi": "vi_VN",
+}
+
+
+class AVTag:
+    pass
+
+
+@dataclass
+class TTSTag(AVTag):
+    field_text: str
+    lang: str
+    voices: List[str] = field(default_factory=list)
+    speed: float = 1.0
+    other_args: List[str] = field(default_factory=list)
+
+
+@dataclass
+class SoundOrVideoTag(AVTag):
+    filename: str
+
+
+@dataclass
+class TTSVoice:
+    name: str
+    lang: str
+
+
+@dataclass
+class TTSVoiceMatch:
+    voice: TTSVoice
+    rank: int
+
+
+class TTSProcessPlayer:
+    def __init__(self, taskman) -> None:
+        self._taskman = taskman
+        self._available_voices: Optional[List[TTSVoice]] = None
+
+    def voices(self) -> List[TTSVoice]:
+        if self._available_voices is None:
+            self._available_voices = self.get_available_voices()
+        return self._available_voices
+
+    def voice_for_tag(self, tag: TTSTag) -> Optional[TTSVoiceMatch]:
+        for voice in self.voices():
+            if voice.lang == tag.lang:
+                return TTSVoiceMatch(voice=voice, rank=0)
+        return None
+
+    def temp_file_for_tag_and_voice(self, tag: AVTag, voice: TTSVoice) -> str:
+        assert isinstance(tag, TTSTag)
+        raw = f"{voice.name}-{voice.lang}-{tag.speed}-{tag.field_text}"
+        return os.path.join(tempfile.gettempdir(), "anki_stub_tts_" + hashlib.sha1(raw.encode("utf-8")).hexdigest())
+
+
+class Hook:
+    def __init__(self) -> None:
+        self._hooks: List[Callable] = []
+
+    def append(self, callback: Callable) -> None:
+        self._hooks.append(callback)
+
+    def remove(self, callback: Callable) -> None:
+        if callback in self._hooks:
+            self._hooks.remove(callback)
+
+    def __call__(self, *args) -> None:
+        for callback in list(self._hooks):
+            callback(*args)
+
+
+class Hooks:
+    def __getattr__(self, name: str) -> Hook:
+        hook = Hook()
+        setattr(self, name, hook)
+        return hook
+
+
+class QtStub:
+    """Accepts any constructor arguments, attribute access and call."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        return QtStub()
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return None
+
+
+class AddonManager:
+    def __init__(self, config: Dict[str, Any]) -> None:
+        self.config = config
+        self.config_updated_actions: Dict[str, Callable] = {}
+
+    def getConfig(self, module: str) -> Dict[str, Any]:
+        return copy.deepcopy(self.config)
+
+    def writeConfig(self, module: str, conf: Dict[str, Any]) -> None:
+        self.config = copy.deepcopy(conf)
+
+    def setConfigUpdatedAction(self, module: str, action: Callable) -> None:
+        self.config_updated_actions[module] = action
+
+
+class TaskManager:
+    """Runs everything synchronously on the calling thread."""
+
+    def run_in_background(self, task: Callable, on_done: Optional[Callable] = None, **kwargs) -> None:
+        from concurrent.futures import Future
+
+        future: Future = Future()
+        try:
+            future.set_result(task())
+        except Exception as e:
+            future.set_exception(e)
+        if on_done:
+            on_done(future)
+
+    def with_progress(self, task: Callable, on_done: Optional[Callable] = None, **kwargs) -> None:
+        self.run_in_background(task, on_done)
+
+    def run_on_main(self, closure: Callable) -> None:
+        closure()
+
+
+class AVPlayer:
+    def __init__(self) -> None:
+        self.players: List[Any] = []
+        self.played: List[str] = []
+        self._enqueued: List[Any] = []
+
+    def insert_file(self, filename: str) -> None:
+        self._enqueued.insert(0, SoundOrVideoTag(filename=filename))
+
+    def _play_next_if_idle(self) -> None:
+        # Plays instantly: drains the queue into `played`.
+        while self._enqueued:
+            tag = self._enqueued.pop(0)
+            self.played.append(getattr(tag, "filename", tag))
+
+
+def load_config() -> Dict[str, Any]:
+    with open(os.path.join(ADDON_DIR, "config.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    sys.modules[name] = mod
+    return mod
+
+
+def install(config: Optional[Dict[str, Any]] = None) -> types.SimpleNamespace:
+    """
+    Registers the stub modules in sys.modules. `config` entries override
+    the add-on's config.json. Returns the fake main window.
+    """
+    conf = load_config()
+    conf.update(config or {})
+
+    mw = types.SimpleNamespace(
+        addonManager=AddonManager(conf),
+        taskman=TaskManager(),
+        progress=types.SimpleNamespace(update=lambda **kwargs: None, want_cancel=lambda: False),
+        form=types.SimpleNamespace(menuTools=QtStub()),
+        col=None,
+        reviewer=None,
+    )
+    av_player = AVPlayer()
+
+    anki = module("anki")
+    anki.lang = module("anki.lang", compatMap=dict(COMPAT_MAP))
+    anki.sound = module("anki.sound", AVTag=AVTag, SoundOrVideoTag=SoundOrVideoTag, TTSTag=TTSTag)
+
+    qt = module("aqt.qt")
+    qt.__getattr__ = lambda name: QtStub
+    aqt = module("aqt", mw=mw, gui_hooks=Hooks())
+    aqt.qt = qt
+    aqt.utils = module(
+        "aqt.utils",
+        showInfo=lambda text, **kwargs: print(text),
+        qconnect=lambda signal, slot: None,
+        getText=lambda *args, **kwargs: ("", False),
+    )
+    aqt.sound = module("aqt.sound", OnDoneCallback=Callable[[], None], av_player=av_player)
+    aqt.tts = module(
+        "aqt.tts", TTSProcessPlayer=TTSProcessPlayer, TTSVoice=TTSVoice, TTSVoiceMatch=TTSVoiceMatch
+    )
+    return mw
+
+
+def load_addon(name: str = "tts_addon") -> types.ModuleType:
+    """Imports the add-on package from the repository root under `name`."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(ADDON_DIR, "__init__.py"), submodule_search_locations=[ADDON_DIR]
+    )
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules[name] = addon
+    spec.loader.exec_module(addon)
+    return addon
@@ -0,0 +1,339 @@
+"""
+Offline benchmark of the add-on's playback pipeline.
+
+Imports the add-on outside Anki (anki_stubs.py), points gTTS at a local
+fake batchexecute server (fake_batchexecute.py) and Piper at
+fake_piper.py, and measures each scenario:
+
+    dictionary-glob    first lookup of a word in a large dictionary tree, no index
+    dictionary-index   the same through the SQLite index
+    dictionary-memory  repeated lookups served from the in-memory cache
+    gtts-cold          playing texts that have to be downloaded
+    gtts-warm          playing the same texts again (persistent cache hits)
+    gtts-warm-packed   the same with "persistent_cache_backend": "packed"
+    piper-cold         playing texts through one Piper process per utterance
+    piper-worker       the same through a resident Piper worker
+    failover           gTTS failing with errors, falling back to Piper
+    failover-timeout   gTTS slower than gtts_timeout_sec, falling back to Piper
+
+    python tools/bench_pipeline.py [--ops 100] [--scenarios gtts-cold,gtts-warm]
+    python tools/bench_pipeline.py --json baseline.json
+    python tools/bench_pipeline.py --compare baseline.json [--tolerance 0.25]
+
+With --compare, the exit status is 1 if any scenario's p95 latency grew,
+or its throughput dropped, by more than the tolerance (and by more than
+--min-delta-ms per operation, so sub-millisecond noise is ignored). Everything runs in
+a temporary directory; the add-on folder is not touched.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TOOLS_DIR)
+
+from anki_stubs import TTSTag, install, load_addon  # noqa: E402
+from fake_batchexecute import point_gtts_at, start_server  # noqa: E402
+
+LANG = "de_DE"
+DICT_FOLDER = "de"
+SCENARIOS = [
+    "dictionary-glob",
+    "dictionary-index",
+    "dictionary-memory",
+    "gtts-cold",
+    "gtts-warm",
+    "gtts-warm-packed",
+    "piper-cold",
+    "piper-worker",
+    "failover",
+    "failover-timeout",
+]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], ok: int, wall: float) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "ops": len(values),
+        "ok": ok,
+        "ops_per_sec": round(len(values) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def measure(op: Callable[[int], bool], count: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    results: List[bool] = []
+
+    def timed_op(i: int) -> None:
+        start = time.perf_counter()
+        ok = op(i)
+        latencies.append(time.perf_counter() - start)
+        results.append(bool(ok))
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed_op, range(count)))
+    else:
+        for i in range(count):
+            timed_op(i)
+    return summarize(latencies, sum(results), time.perf_counter() - start)
+
+
+def build_dictionary(root: str, words: int, speakers: int) -> List[str]:
+    names = [f"wort{i:06d}" for i in range(words)]
+    for s in range(speakers):
+        speaker_dir = os.path.join(root, DICT_FOLDER, f"speaker{s:02d}")
+        os.makedirs(speaker_dir, exist_ok=True)
+        # Every speaker recorded two thirds of the words.
+        for i, name in enumerate(names):
+            if (i + s) % 3:
+                with open(os.path.join(speaker_dir, name + ".mp3"), "wb") as f:
+                    f.write(b"\xff\xfb\x90\x64")
+    return names
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="tts_bench_")
+        self.dict_root = os.path.join(self.workdir, "dictionary")
+        os.environ["FAKE_PIPER_DELAY"] = str(args.piper_delay)
+        self.mw = install(config={
+            "audio_dictionary_enabled": False,
+            "audio_dictionary_path": self.dict_root,
+            "audio_dictionary_lang_map": {LANG: DICT_FOLDER},
+            "audio_dictionary_exclusions": [],
+            "audio_dictionary_cycle_enabled": False,
+            "persistent_cache_enabled": True,
+            "persistent_cache_path": os.path.join(self.workdir, "cache"),
+            "gtts_cache_enabled": True,
+            "piper_cache_enabled": True,
+            "piper_python_path": sys.executable,
+            "piper_script_path": os.path.join(TOOLS_DIR, "fake_piper.py"),
+            "piper_worker_enabled": False,
+            "tts_cycle_enabled": False,
+            "prefetch_enabled": False,
+            "gtts_streaming_enabled": False,
+            "stats_enabled": False,
+        })
+        self.addon = load_addon()
+        # Keep the dictionary index out of the add-on folder.
+        self.addon.AUDIO_INDEX = self.addon.AudioDictionaryIndex(os.path.join(self.workdir, "index.sqlite3"))
+        self.server = start_server(latency=args.gtts_latency, jitter=args.gtts_jitter, seed=args.seed)
+        point_gtts_at(self.server.url)
+        self.words: List[str] = []
+        self.local = threading.local()
+
+    def close(self) -> None:
+        self.addon.PIPER_WORKERS.shutdown()
+        self.addon.FILE_CACHE.flush()
+        self.addon.PACKED_CACHE.close()
+        self.server.shutdown()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def configure(self, **overrides) -> None:
+        conf = self.addon.get_config()
+        conf.update(overrides)
+        self.addon.write_config(conf)
+
+    def reset(self) -> None:
+        self.addon.AUDIO_LOOKUP_CACHE.clear()
+        self.addon.TTS_CYCLE_STATE.clear()
+        self.addon.GTTS_FETCHER.breaker.record_success()
+        self.server.configure(latency=self.args.gtts_latency, failure_rate=0.0)
+
+    def play(self, text: str) -> bool:
+        # Anki plays one tag at a time per player; concurrent callers get their own.
+        player = getattr(self.local, "player", None)
+        if player is None:
+            player = self.local.player = self.addon.GTTSPlayer(self.mw.taskman)
+        player._play(TTSTag(field_text=text, lang=LANG))
+        return bool(player._tmpfile)
+
+    def texts(self, prefix: str) -> List[str]:
+        return [f"{prefix} Beispielsatz Nummer {i} für die Messung." for i in range(self.args.ops)]
+
+    def ensure_dictionary(self) -> None:
+        if not self.words:
+            start = time.perf_counter()
+            self.words = build_dictionary(self.dict_root, self.args.dict_words, self.args.dict_speakers)
+            print(f"built dictionary: {len(self.words)} words x {self.args.dict_speakers} speakers "
+                  f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    def dictionary_ops(self) -> List[str]:
+        # Half the lookups hit a recorded word, half miss.
+        rng = random.Random(self.args.seed)
+        count = min(self.args.ops, len(self.words))
+        hits = rng.sample(self.words, count - count // 2)
+        misses = [f"fehlt{i:06d}" for i in range(count // 2)]
+        lookups = hits + misses
+        rng.shuffle(lookups)
+        return lookups
+
+    def run(self, scenario: str) -> Dict[str, float]:
+        self.reset()
+        concurrency = self.args.concurrency
+        find = self.addon.find_in_audio_dictionary
+
+        if scenario.startswith("dictionary"):
+            self.ensure_dictionary()
+            lookups = self.dictionary_ops()
+            indexed = scenario != "dictionary-glob"
+            self.configure(audio_dictionary_enabled=True, audio_dictionary_index_enabled=indexed)
+            if indexed:
+                index = self.addon.AUDIO_INDEX
+                index.configure(self.dict_root, [])
+                start = time.perf_counter()
+                index.refresh()
+                index.last_refresh = time.time()
+                print(f"index build: {time.perf_counter() - start:.2f}s", file=sys.stderr)
+            if scenario == "dictionary-memory":
+                for word in lookups:
+                    find(word, LANG)
+            result = measure(lambda i: find(lookups[i], LANG) or lookups[i].startswith("fehlt"), len(lookups), concurrency)
+            self.configure(audio_dictionary_enabled=False)
+            return result
+
+        if scenario in ("gtts-cold", "gtts-warm", "gtts-warm-packed"):
+            packed = scenario == "gtts-warm-packed"
+            self.configure(
+                tts_engine="gTTS", gtts_enabled=True, piper_enabled=False,
+                persistent_cache_backend="packed" if packed else "files"
+            )
+            texts = self.texts("gtts-packed" if packed else "gtts")
+            if scenario != "gtts-cold":
+                for text in texts:
+                    self.play(text)
+            result = measure(lambda i: self.play(texts[i]), len(texts), concurrency)
+            self.configure(persistent_cache_backend="files")
+            return result
+
+        if scenario in ("piper-cold", "piper-worker"):
+            worker = scenario == "piper-worker"
+            self.configure(tts_engine="Piper", gtts_enabled=False, piper_enabled=True, piper_worker_enabled=worker)
+            texts = self.texts(scenario)
+            if worker:
+                # Model load happens once per session; keep it out of the numbers.
+                self.play(f"{scenario} warm-up")
+            return measure(lambda i: self.play(texts[i]), len(texts), concurrency)
+
+        if scenario in ("failover", "failover-timeout"):
+            timeout = self.args.gtts_timeout
+            self.configure(
+                tts_engine="gTTS", gtts_enabled=True, piper_enabled=True,
+                piper_worker_enabled=True, gtts_timeout_sec=timeout
+            )
+            if scenario == "failover":
+                self.server.configure(failure_rate=1.0)
+            else:
+                self.server.configure(latency=timeout * 2)
+            self.play(f"{scenario} warm-up")
+            texts = self.texts(scenario)
+            result = measure(lambda i: self.play(texts[i]), len(texts), concurrency)
+            self.configure(gtts_timeout_sec=5, piper_worker_enabled=False)
+            return result
+
+        raise ValueError(f"unknown scenario {scenario!r}")
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float, min_delta_ms: float) -> List[str]:
+    """Slow-downs beyond `tolerance` that are also larger than min_delta_ms per operation."""
+    regressions = []
+    for scenario, current in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        p95_delta = current["p95_ms"] - base["p95_ms"]
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) and p95_delta > min_delta_ms:
+            regressions.append(f"{scenario}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if base["ops_per_sec"] and current["ops_per_sec"]:
+            per_op_delta = 1000 / current["ops_per_sec"] - 1000 / base["ops_per_sec"]
+            if current["ops_per_sec"] < base["ops_per_sec"] / (1 + tolerance) and per_op_delta > min_delta_ms:
+                regressions.append(f"{scenario}: {base['ops_per_sec']:.1f} -> {current['ops_per_sec']:.1f} ops/s")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset")
+    parser.add_argument("--ops", type=int, default=100, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="parallel callers")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--gtts-latency", type=float, default=0.05, help="fake server seconds per request")
+    parser.add_argument("--gtts-jitter", type=float, default=0.01)
+    parser.add_argument("--gtts-timeout", type=float, default=0.3, help="gtts_timeout_sec for the failover scenarios")
+    parser.add_argument("--piper-delay", type=float, default=0.02, help="fake Piper seconds per utterance")
+    parser.add_argument("--dict-words", type=int, default=5000)
+    parser.add_argument("--dict-speakers", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slow-down")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slow-downs smaller than this")
+    parser.add_argument("--verbose", action="store_true", help="show the add-on's own output")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    bench = Bench(args)
+    results = {}
+    try:
+        print(f"{'scenario':<20}{'ops':>6}{'ok':>6}{'ops/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+        for scenario in scenarios:
+            if args.verbose:
+                result = bench.run(scenario)
+            else:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = bench.run(scenario)
+            results[scenario] = result
+            print(
+                f"{scenario:<20}{result['ops']:>6}{result['ok']:>6}{result['ops_per_sec']:>10.1f}"
+                f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['max_ms']:>10.2f}"
+            )
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bench.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Micro-benchmark for the gTTS text pre-processors.
+
+Compares the pre-processors as they were built before (new regex objects
+on every call) with the precompiled ones in gtts.tokenizer.pre_processors
+over a corpus of typical card texts, and checks both give the same output.
+
+    python tools/bench_pre_processors.py [--repeat 5] [--corpus cards.txt]
+
+--corpus takes a UTF-8 file with one card text per line; by default a
+synthetic corpus of words, phrases and sentences is used.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vendor"))
+
+from gtts.tokenizer import PreProcessorRegex, PreProcessorSub, symbols  # noqa: E402
+from gtts.tokenizer import pre_processors  # noqa: E402
+
+
+def legacy_tone_marks(text):
+    return PreProcessorRegex(
+        search_args=symbols.TONE_MARKS,
+        search_func=lambda x: u"(?<={})".format(x),
+        repl=" ",
+    ).run(text)
+
+
+def legacy_end_of_line(text):
+    return PreProcessorRegex(
+        search_args="-", search_func=lambda x: u"{}\n".format(x), repl=""
+    ).run(text)
+
+
+def legacy_abbreviations(text):
+    return PreProcessorRegex(
+        search_args=symbols.ABBREVIATIONS,
+        search_func=lambda x: r"(?<={})(?=\.).".format(x),
+        repl="",
+        flags=re.IGNORECASE,
+    ).run(text)
+
+
+def legacy_word_sub(text):
+    return PreProcessorSub(sub_pairs=symbols.SUB_PAIRS).run(text)
+
+
+LEGACY = [legacy_tone_marks, legacy_end_of_line, legacy_abbreviations, legacy_word_sub]
+CURRENT = [
+    pre_processors.tone_marks,
+    pre_processors.end_of_line,
+    pre_processors.abbreviations,
+    pre_processors.word_sub,
+]
+
+WORDS = (
+    "der die das Haus Baum laufen schnell schön Straße Mädchen the house run quickly "
+    "beautiful street girl молоко книга читать быстро дом школа"
+).split()
+SENTENCE_ENDS = [".", "!", "?", "", ",", "…"]
+SPECIAL = ["Dr. Müller kommt.", "Mr. Smith, Esq.", "Wie bitte?!", "zusammen-\ngesetzt", "St. Petersburg"]
+
+
+def synthetic_corpus(size, seed=1):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        kind = rng.random()
+        if kind < 0.5:
+            corpus.append(rng.choice(WORDS))
+        elif kind < 0.8:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(2, 6))]
+            corpus.append(" ".join(words) + rng.choice(SENTENCE_ENDS))
+        elif kind < 0.95:
+            sentences = []
+            for _ in range(rng.randint(2, 5)):
+                words = [rng.choice(WORDS) for _ in range(rng.randint(4, 12))]
+                sentences.append(" ".join(words).capitalize() + rng.choice(SENTENCE_ENDS))
+            corpus.append(" ".join(sentences))
+        else:
+            corpus.append(rng.choice(SPECIAL))
+    return corpus
+
+
+def run_pipeline(funcs, corpus):
+    out = []
+    for text in corpus:
+        for func in funcs:
+            text = func(text)
+        out.append(text)
+    return out
+
+
+def best_of(funcs, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_pipeline(funcs, corpus)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size", type=int, default=5000, help="synthetic corpus size")
+    parser.add_argument("--corpus", help="file with one card text per line")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        corpus = synthetic_corpus(args.size)
+
+    if run_pipeline(LEGACY, corpus) != run_pipeline(CURRENT, corpus):
+        print("MISMATCH: precompiled pre-processors differ from the legacy output")
+        return 1
+
+    legacy = best_of(LEGACY, corpus, args.repeat)
+    current = best_of(CURRENT, corpus, args.repeat)
+    n = len(corpus)
+    print(f"texts: {n}, outputs identical")
+    print(f"legacy:      {legacy * 1000:8.1f} ms  {legacy / n * 1e6:8.2f} us/text")
+    print(f"precompiled: {current * 1000:8.1f} ms  {current / n * 1e6:8.2f} us/text")
+    print(f"speed-up:    {legacy / current:8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
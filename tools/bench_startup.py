@@ -0,0 +1,92 @@
+"""
+Startup benchmark: how long importing the add-on takes.
+
+Each run imports the add-on in a fresh interpreter (with the stubs from
+anki_stubs.py standing in for Anki) and measures the import alone, then
+the cost that was deferred: the first gTTS import and the voice list.
+
+    python tools/bench_startup.py [--runs 10] [--eager]
+
+--eager imports gtts.tts together with the add-on, which is what every
+Anki launch paid before gTTS was loaded lazily.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def child(eager: bool) -> None:
+    sys.path.insert(0, TOOLS_DIR)
+    from anki_stubs import install, load_addon
+
+    # Keep the measurement to imports: no dictionary index on disk.
+    install(config={"audio_dictionary_enabled": False})
+
+    start = time.perf_counter()
+    addon = load_addon()
+    if eager:
+        importlib.import_module("gtts.tts")
+    import_ms = (time.perf_counter() - start) * 1000
+    loaded = {name: name in sys.modules for name in ("requests", "urllib3", "gtts.tts")}
+
+    start = time.perf_counter()
+    importlib.import_module("gtts.tts")
+    deferred_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    addon.PLAYER.get_available_voices()
+    voices_first_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    addon.PLAYER.get_available_voices()
+    voices_again_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        "import_ms": import_ms,
+        "deferred_ms": deferred_ms,
+        "voices_first_ms": voices_first_ms,
+        "voices_again_ms": voices_again_ms,
+        "loaded": loaded,
+    }))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--eager", action="store_true", help="import gtts.tts at startup, as before")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.eager)
+        return 0
+
+    command = [sys.executable, os.path.abspath(__file__), "--child"] + (["--eager"] if args.eager else [])
+    results = []
+    for _ in range(args.runs):
+        out = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    def row(label, key):
+        values = [r[key] for r in results]
+        print(f"{label:<26}median {statistics.median(values):8.2f} ms   min {min(values):8.2f} ms")
+
+    print(f"runs: {args.runs}, mode: {'eager' if args.eager else 'lazy'}")
+    row("add-on import", "import_ms")
+    row("first gTTS import", "deferred_ms")
+    row("voice list (first call)", "voices_first_ms")
+    row("voice list (memoized)", "voices_again_ms")
+    loaded = ", ".join(f"{name}={'yes' if value else 'no'}" for name, value in results[0]["loaded"].items())
+    print(f"loaded at startup: {loaded}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
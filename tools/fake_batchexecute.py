@@ -0,0 +1,141 @@
+"""
+Local stand-in for Google Translate's batchexecute TTS endpoint.
+
+Answers every request with a few bytes of fake MP3 after a configurable
+delay, and fails a configurable share of requests, so the gTTS code
+paths can be measured and tested offline and reproducibly.
+
+As a server:
+    python fake_batchexecute.py --port 8765 --latency 0.15 --jitter 0.05 --failure-rate 0.1
+
+In-process (used by bench_pipeline.py):
+    server = start_server(latency=0.15)
+    point_gtts_at(server.url)
+    ...
+    server.shutdown()
+
+Failures alternate between HTTP 500 and a 200 response without audio,
+which gTTS reports as two different errors.
+"""
+
+import argparse
+import base64
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# An MPEG frame header followed by padding; enough for the add-on, which never decodes audio.
+FAKE_MP3 = b"\xff\xfb\x90\x64" + b"\x00" * 412
+
+
+class FakeBatchExecuteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; don't let Nagle hold the body back.
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        with server.lock:
+            server.requests += 1
+            delay = max(0.0, server.rng.gauss(server.latency, server.jitter)) if server.jitter else server.latency
+            fail = server.rng.random() < server.failure_rate
+        time.sleep(delay)
+
+        if fail:
+            with server.lock:
+                server.failures += 1
+                status_error = server.failures % 2 == 1
+            if status_error:
+                self.send_error(500, "simulated failure")
+                return
+            payload = b")]}'\n\n[[\"wrb.fr\",\"jQ1olc\",null,null,null,[3],\"generic\"]]"
+        else:
+            try:
+                rpc = json.loads(urllib.parse.unquote(body[len("f.req="):-1]))
+                text = json.loads(rpc[0][0][1])[0]
+            except (ValueError, IndexError, TypeError):
+                text = ""
+            audio = base64.b64encode(FAKE_MP3 + text.encode("utf-8")).decode("ascii")
+            payload = (')]}\'\n\n[["wrb.fr","jQ1olc","[\\"' + audio + '\\"]",null,null,null,"generic"]]').encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeBatchExecuteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 1):
+        super().__init__(("127.0.0.1", port), FakeBatchExecuteHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up (gTTS timeouts) are expected here.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/batchexecute"
+
+    def configure(self, latency: float = None, jitter: float = None, failure_rate: float = None) -> None:
+        with self.lock:
+            if latency is not None:
+                self.latency = latency
+            if jitter is not None:
+                self.jitter = jitter
+            if failure_rate is not None:
+                self.failure_rate = failure_rate
+
+
+def start_server(**kwargs) -> FakeBatchExecuteServer:
+    """Starts a server on a free port in a background thread."""
+    server = FakeBatchExecuteServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def point_gtts_at(url: str) -> None:
+    """Sends all requests of the (already importable) gtts package to url, bypassing proxies."""
+    import gtts.tts
+
+    gtts.tts._translate_url = lambda tld="com", path="": url
+    gtts.tts.urllib.request.getproxies = lambda: {}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests that fail, 0-1")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = FakeBatchExecuteServer(args.port, args.latency, args.jitter, args.failure_rate, args.seed)
+    print(f"Serving fake batchexecute on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Stand-in for the Piper TTS command-line utility.
+
+Writes short silent WAV files instead of synthesizing speech, so the
+Piper code paths of the add-on can be exercised without Piper or voice
+models installed. Point "piper_script_path" at this file to use it.
+
+One-shot mode (same arguments as piper_tts.py):
+    python fake_piper.py --lang de --text "Hallo" --output-file out.wav
+
+Worker mode (see piper_worker.py for the protocol):
+    python fake_piper.py --worker --lang de
+
+Batch mode (see piper_worker.py for the job file format):
+    python fake_piper.py --lang de --batch-file jobs.jsonl
+
+Delays can be simulated with --load-delay (model load) and --delay
+(per utterance), or the FAKE_PIPER_LOAD_DELAY / FAKE_PIPER_DELAY
+environment variables. Texts containing FAIL are answered with an
+error; texts containing CRASH make the process exit without answering.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+
+SAMPLE_RATE = 16000
+
+
+def write_wav(path: str, text: str) -> None:
+    frames = int(SAMPLE_RATE * min(2.0, 0.05 * max(1, len(text))))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(b"\x00\x00" * frames)
+
+
+def synthesize(text: str, output_file: str, delay: float) -> None:
+    if not text.strip():
+        raise ValueError("empty text")
+    if "FAIL" in text:
+        raise RuntimeError(f"simulated failure for {text!r}")
+    if "CRASH" in text:
+        os._exit(3)
+    time.sleep(delay)
+    write_wav(output_file, text)
+
+
+def run_worker(delay: float) -> int:
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request = json.loads(line)
+        try:
+            synthesize(request["text"], request["output_file"], delay)
+            response = {"id": request.get("id"), "ok": True}
+        except Exception as e:
+            response = {"id": request.get("id"), "ok": False, "error": str(e)}
+        print(json.dumps(response), flush=True)
+    return 0
+
+
+def run_batch_file(path: str, delay: float) -> int:
+    with open(path, encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            job_id = job.get("id", index)
+            try:
+                synthesize(job["text"], job["output_file"], delay)
+                response = {"id": job_id, "ok": True}
+            except Exception as e:
+                response = {"id": job_id, "ok": False, "error": str(e)}
+            print(json.dumps(response), flush=True)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--text")
+    parser.add_argument("--output-file")
+    parser.add_argument("--worker", action="store_true")
+    parser.add_argument("--batch-file")
+    parser.add_argument("--delay", type=float, default=float(os.environ.get("FAKE_PIPER_DELAY", 0)))
+    parser.add_argument("--load-delay", type=float, default=float(os.environ.get("FAKE_PIPER_LOAD_DELAY", 0)))
+    args = parser.parse_args()
+
+    time.sleep(args.load_delay)
+
+    if args.worker:
+        return run_worker(args.delay)
+    if args.batch_file:
+        return run_batch_file(args.batch_file, args.delay)
+
+    if args.text is None or not args.output_file:
+        parser.error("--text and --output-file are required in one-shot mode")
+    try:
+        synthesize(args.text, args.output_file, args.delay)
+    except Exception as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
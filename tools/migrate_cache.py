@@ -0,0 +1,115 @@
+"""
+Moves a persistent cache from the one-file-per-clip layout into pack
+files, for "persistent_cache_backend": "packed".
+
+    python migrate_cache.py [CACHE_DIR] [--delete] [--compact]
+
+CACHE_DIR defaults to user_cache in the add-on folder. Clips named by
+content key (<cache_dir>/ab/abcdef....mp3) are appended to the packs;
+files from the old flat layout are named after their text and are
+skipped, since their key cannot be recovered. With --delete, migrated
+files and the file backend's index are removed afterwards. Close Anki
+(or at least the profile) before running this.
+"""
+
+import argparse
+import os
+import sys
+import time
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import the add-on's modules without running its Anki-dependent __init__.
+package = types.ModuleType("tts_addon")
+package.__path__ = [ADDON_DIR]
+sys.modules.setdefault("tts_addon", package)
+
+from tts_addon.packed_cache import EXT_CODES, PackedCache  # noqa: E402
+from tts_addon.persistent_cache import PersistentCache  # noqa: E402
+
+
+def iter_clips(cache_dir: str):
+    """(path, content key, extension) for every clip in the file layout."""
+    for dirpath, dirnames, filenames in os.walk(cache_dir):
+        if os.path.normpath(dirpath) == os.path.normpath(cache_dir) and PackedCache.PACK_DIR in dirnames:
+            dirnames.remove(PackedCache.PACK_DIR)
+        for filename in filenames:
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in EXT_CODES:
+                continue
+            yield os.path.join(dirpath, filename), stem, ext.lower()
+
+
+def is_content_key(stem: str) -> bool:
+    if len(stem) != 40:
+        return False
+    try:
+        bytes.fromhex(stem)
+    except ValueError:
+        return False
+    return True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cache_dir", nargs="?", default=os.path.join(ADDON_DIR, "user_cache"))
+    parser.add_argument("--delete", action="store_true", help="remove migrated files afterwards")
+    parser.add_argument("--compact", action="store_true", help="compact the packs afterwards")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        parser.error(f"not a directory: {args.cache_dir}")
+
+    store = PackedCache()
+    store.configure(args.cache_dir, 0)
+    start = time.monotonic()
+    migrated = skipped = total_bytes = 0
+    done = []
+    for path, stem, ext in iter_clips(args.cache_dir):
+        if not is_content_key(stem):
+            skipped += 1
+            continue
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            print(f"cannot read {path}: {e}", file=sys.stderr)
+            skipped += 1
+            continue
+        if not data:
+            skipped += 1
+            continue
+        store.add(stem, ext, data)
+        migrated += 1
+        total_bytes += len(data)
+        done.append(path)
+
+    if args.compact:
+        store.compact()
+    stats = store.stats()
+    store.close()
+    print(f"Migrated {migrated} clips ({total_bytes / (1024 * 1024):.1f} MB) in {time.monotonic() - start:.1f}s, "
+          f"skipped {skipped}. Packs: {stats['packs']} files, {stats['packs_mb']} MB.")
+
+    if args.delete:
+        for path in done:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"cannot remove {path}: {e}", file=sys.stderr)
+        for dirpath, _, _ in sorted(os.walk(args.cache_dir), key=lambda item: -len(item[0])):
+            if dirpath != args.cache_dir:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+        index_path = os.path.join(args.cache_dir, PersistentCache.INDEX_NAME)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        print(f"Removed {len(done)} migrated files.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())